@@ -137,6 +137,25 @@ else:
         },
     }
 
+# Drive rooms from the `run_game_engine` worker instead of the web processes.
+# Needs a channel layer shared between processes (Redis).
+GAME_ENGINE_WORKER = os.getenv('GAME_ENGINE_WORKER') == 'True'
+
+# Settle a win as soon as the engine sees it instead of waiting for the
+# player to press BINGO (who is then only told a bingo is available)
+BINGO_AUTO_SETTLE = os.getenv('BINGO_AUTO_SETTLE') == 'True'
+
+# Claims completed on the same call: 'first' pays the first to arrive,
+# 'split' shares the bonus between them
+BINGO_TIE_RULE = os.getenv('BINGO_TIE_RULE', 'first')
+
+# Where shared room state (players, phase, called numbers, cards) lives
+if os.getenv('DEBUG') == 'True':
+    ROOM_STATE_BACKEND = 'memory'
+else:
+    ROOM_STATE_BACKEND = 'redis'
+ROOM_STATE_REDIS_URL = os.getenv('REDIS_URL')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -178,6 +197,10 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'    # Where collectstatic puts files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Binary card catalog written by `manage.py build_card_catalog`, the preset
+# cards are used while it does not exist
+CARD_CATALOG_PATH = os.getenv('CARD_CATALOG_PATH', BASE_DIR / 'cards.bin')
+
 # Ensure Django can find static files
 STATICFILES_FINDERS = [
     'django.contrib.staticfiles.finders.FileSystemFinder',
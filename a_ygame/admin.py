@@ -1,11 +1,11 @@
 from django.contrib import admin
-from .models import Room, Player, Game
+from .models import Room, Player, Game, RoomLease
 
 @admin.register(Room)
 class RoomAdmin(admin.ModelAdmin):
-    list_display = ('room_name', 'stake', 'is_active', 'created_at')
+    list_display = ('room_name', 'stake', 'pattern_set', 'card_count', 'call_interval', 'is_active', 'created_at')
     search_fields = ('room_name',)
-    list_filter = ('is_active',)
+    list_filter = ('is_active', 'pattern_set')
 
 @admin.register(Player)
 class PlayerAdmin(admin.ModelAdmin):
@@ -15,6 +15,12 @@ class PlayerAdmin(admin.ModelAdmin):
 
 @admin.register(Game)
 class GameAdmin(admin.ModelAdmin):
-    list_display = ('room', 'is_active', 'winner', 'created_at')
+    list_display = ('room', 'is_active', 'winner', 'cursor', 'created_at')
+    readonly_fields = ('seed',)
     search_fields = ('room__room_name',)
-    list_filter = ('is_active',)
\ No newline at end of file
+    list_filter = ('is_active',)
+
+@admin.register(RoomLease)
+class RoomLeaseAdmin(admin.ModelAdmin):
+    list_display = ('room_name', 'owner', 'expires_at')
+    search_fields = ('room_name', 'owner')
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""
+Decides which bingo claims win a game, in memory. Plain Python, no Django
+imports.
+
+Every claim is ranked by the draw cursor at which its card first completed a
+pattern, so a player who won earlier but pressed BINGO later still beats a
+later win. Claims with the same cursor are tied and split by the tie rule.
+"""
+from a_ygame.bingo import PATTERNS, CENTER
+
+# Tie rules for claims completed at the same cursor
+TIE_FIRST = 'first'  # the claim that arrived first wins alone
+TIE_SPLIT = 'split'  # every tied claim wins a share
+
+
+class Claim:
+    def __init__(self, username, card_number, cursor, pattern, reply_channel=None):
+        self.username = username
+        self.card_number = card_number
+        self.cursor = cursor
+        self.pattern = pattern
+        self.reply_channel = reply_channel
+
+
+def win_cursor(card, positions, patterns=PATTERNS):
+    """
+    (cursor, pattern) of the earliest pattern the card completed, where
+    `positions` maps each number to its index in the draw. None if no pattern
+    can ever be completed.
+    """
+    best = None
+    for pattern in patterns:
+        cells = [card[i] for i in pattern if i != CENTER]
+        if not all(cell in positions for cell in cells):
+            continue
+        cursor = max(positions[cell] for cell in cells) + 1
+        if best is None or cursor < best[0]:
+            best = (cursor, pattern)
+    return best
+
+
+class ClaimArbiter:
+    """Collects the claims of one game and picks the winners once"""
+
+    def __init__(self, game_id, sequence, tie_rule=TIE_FIRST, patterns=PATTERNS):
+        self.game_id = game_id
+        self.patterns = patterns
+        self.positions = {number: index for index, number in enumerate(sequence)}
+        self.tie_rule = tie_rule
+        self.claims = []
+        self.closed = False
+
+    def submit(self, username, card_number, card, called_count, reply_channel=None):
+        """
+        Queue a claim for a card that has won with the first `called_count`
+        numbers. Returns the claim, or None if the game is decided, the card
+        has not won yet, or the player already has a claim queued.
+        """
+        if self.closed or any(claim.username == username for claim in self.claims):
+            return None
+        found = win_cursor(card, self.positions, self.patterns)
+        if found is None or found[0] > called_count:
+            return None
+        claim = Claim(username, card_number, found[0], found[1], reply_channel)
+        self.claims.append(claim)
+        return claim
+
+    def decide(self):
+        """The winning claims (lowest cursor, ties by the tie rule); closes the game"""
+        if self.closed or not self.claims:
+            return []
+        self.closed = True
+        best = min(claim.cursor for claim in self.claims)
+        winners = [claim for claim in self.claims if claim.cursor == best]
+        if self.tie_rule == TIE_SPLIT:
+            return winners
+        return winners[:1]
+
+    def losers(self, winners):
+        return [claim for claim in self.claims if claim not in winners]
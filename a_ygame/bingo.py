@@ -0,0 +1,140 @@
+"""
+Bitmask win verification. Plain Python, no Django imports.
+
+A set of bingo numbers is a 75-bit integer with bit n-1 set for number n.
+Every card is compiled once into one mask per winning pattern, so checking a
+claim is `pattern_mask & called_mask == pattern_mask` over a short table.
+"""
+
+FREE = '*'
+CENTER = 12
+
+# Winning patterns as card indexes, the free center is always marked
+PATTERNS = [
+    [0, 4, 20, 24],              # Four corners
+    [0, 1, 2, 3, 4],             # Rows
+    [5, 6, 7, 8, 9],
+    [10, 11, 13, 14],
+    [15, 16, 17, 18, 19],
+    [20, 21, 22, 23, 24],
+    [0, 5, 10, 15, 20],          # Columns
+    [1, 6, 11, 16, 21],
+    [2, 7, 17, 22],
+    [3, 8, 13, 18, 23],
+    [4, 9, 14, 19, 24],
+    [0, 6, 18, 24],              # Diagonals
+    [4, 8, 16, 20]
+]
+
+# Pattern sets a room can be played with, see Room.pattern_set
+PATTERN_SETS = {
+    'classic': PATTERNS,                           # any line or the four corners
+    'line': PATTERNS[1:],                          # rows, columns and diagonals
+    'four_corners': [[0, 4, 20, 24]],
+    'x': [[0, 4, 6, 8, 16, 18, 20, 24]],           # both diagonals
+    'full_house': [[i for i in range(25) if i != CENTER]],
+}
+
+
+def parse_pattern(pattern):
+    """
+    A pattern as card indexes, from a list of indexes 0-24 or a 25 character
+    '0'/'1' mask. Raises ValueError for anything else, and for a pattern with
+    no cell besides the free center, which every card would win at once.
+    """
+    if isinstance(pattern, str):
+        if len(pattern) != 25 or set(pattern) - {'0', '1'}:
+            raise ValueError(f'{pattern!r} is not a 25 character mask of 0 and 1')
+        indexes = [i for i, cell in enumerate(pattern) if cell == '1']
+    elif isinstance(pattern, list):
+        if not all(type(i) is int and 0 <= i < 25 for i in pattern):
+            raise ValueError(f'{pattern!r} has indexes outside 0-24')
+        indexes = list(dict.fromkeys(pattern))
+    else:
+        raise ValueError(f'{pattern!r} is neither a mask nor a list of indexes')
+    if all(i == CENTER for i in indexes):
+        raise ValueError(f'{pattern!r} has no cell besides the free center')
+    return indexes
+
+
+def get_patterns(name, custom=None):
+    """The patterns of a named set, or the custom ones for 'custom'"""
+    if name == 'custom':
+        if not isinstance(custom, list) or not custom:
+            raise ValueError('Custom rooms need at least one pattern')
+        return [parse_pattern(pattern) for pattern in custom]
+    return PATTERN_SETS[name]
+
+
+def mask(numbers):
+    """Bitmask of bingo numbers, anything outside 1-75 is ignored"""
+    bits = 0
+    for number in numbers:
+        if isinstance(number, int) and 1 <= number <= 75:
+            bits |= 1 << (number - 1)
+    return bits
+
+
+def compile_card(card, patterns=PATTERNS):
+    """
+    [(pattern, mask)] for a 25 cell card. Patterns covering a cell that is
+    not a bingo number (e.g. left unmarked by the client) can never win and
+    are left out.
+    """
+    if len(card) != 25 or card[CENTER] != FREE:
+        return []
+    compiled = []
+    for pattern in patterns:
+        cells = [card[i] for i in pattern if i != CENTER]
+        pattern_mask = mask(cells)
+        if bin(pattern_mask).count('1') == len(cells):
+            compiled.append((pattern, pattern_mask))
+    return compiled
+
+
+def check(compiled, called_mask):
+    """First pattern of a compiled card fully covered by the called numbers"""
+    for pattern, pattern_mask in compiled:
+        if pattern_mask & called_mask == pattern_mask:
+            return pattern
+    return None
+
+
+def verify_bingo(card_numbers, called_numbers, patterns=PATTERNS):
+    """(True, pattern) if the card has a winning pattern, else (False, None)"""
+    pattern = check(compile_card(card_numbers, patterns), mask(called_numbers))
+    return pattern is not None, pattern
+
+
+class WinIndex:
+    """
+    Inverted index from number to the (card, pattern) slots it appears in,
+    with a count of numbers each slot still needs. Calling a number only
+    touches the slots holding it and returns the ones it just completed.
+    """
+
+    def __init__(self, patterns=PATTERNS):
+        self.patterns = patterns
+        self.slots = []      # [(card_key, pattern)]
+        self.remaining = []  # numbers still uncalled per slot
+        self.index = {}      # number -> [slot]
+
+    def add_card(self, key, card):
+        if len(card) != 25 or card[CENTER] != FREE:
+            return
+        for pattern in self.patterns:
+            numbers = [card[i] for i in pattern if i != CENTER]
+            slot = len(self.slots)
+            self.slots.append((key, pattern))
+            self.remaining.append(len(numbers))
+            for number in numbers:
+                self.index.setdefault(number, []).append(slot)
+
+    def call(self, number):
+        """Mark a number called, returns [(card_key, pattern)] completed by it"""
+        completed = []
+        for slot in self.index.pop(number, ()):
+            self.remaining[slot] -= 1
+            if self.remaining[slot] == 0:
+                completed.append(self.slots[slot])
+        return completed
@@ -0,0 +1,143 @@
+"""
+The card catalog: every card a room can sell, in a fixed-width binary file.
+
+Each card is 25 bytes, its cells in row order (B I N G O columns) with the
+free center stored as 0, so card number n starts at byte (n - 1) * 25. The
+file is memory-mapped read-only, which lets every worker share the same
+pages, and `raw` hands out slices of the map without copying.
+
+Build a catalog with `python manage.py build_card_catalog`; without one the
+preset cards are served from memory.
+"""
+import hashlib
+import json
+import mmap
+import os
+import random
+
+from a_ygame.bingo import FREE, CENTER, compile_card, check, mask, PATTERNS
+from a_ygame.cards import presetCards
+
+CARD_SIZE = 25
+MAX_CACHED_BLOBS = 64
+
+
+def generate_card(rng):
+    """A valid 75-ball card: column c holds 5 distinct numbers from 15c+1 to 15c+15"""
+    columns = [rng.sample(range(15 * col + 1, 15 * col + 16), 5) for col in range(5)]
+    card = [columns[col][row] for row in range(5) for col in range(5)]
+    card[CENTER] = FREE
+    return card
+
+
+def generate_cards(count, seed=0, start=()):
+    """
+    `count` unique cards, the same ones for the same seed. Cards in `start`
+    come first and keep their numbers.
+    """
+    rng = random.Random(seed)
+    cards = [list(card) for card in start][:count]
+    seen = {tuple(card) for card in cards}
+    while len(cards) < count:
+        card = generate_card(rng)
+        key = tuple(card)
+        if key not in seen:
+            seen.add(key)
+            cards.append(card)
+    return cards
+
+
+def encode_card(card):
+    return bytes(0 if cell == FREE else cell for cell in card)
+
+
+def write_catalog(path, cards):
+    """Write cards to a catalog file, replacing it atomically"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        for card in cards:
+            f.write(encode_card(card))
+    os.replace(tmp_path, path)
+
+
+class CardCatalog:
+    """Read-only view of the cards, numbered from 1"""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.compiled = {}  # patterns -> {card_number: [(pattern, mask)]}
+        self.blobs = {}  # (first, last) -> (json bytes, etag)
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def from_cards(cls, cards):
+        return cls(b''.join(encode_card(card) for card in cards))
+
+    def __len__(self):
+        return len(self.data) // CARD_SIZE
+
+    def __contains__(self, card_number):
+        return isinstance(card_number, int) and 1 <= card_number <= len(self)
+
+    def raw(self, card_number):
+        """The card's 25 bytes, a slice of the catalog (no copy)"""
+        offset = (card_number - 1) * CARD_SIZE
+        return self.data[offset:offset + CARD_SIZE]
+
+    def card(self, card_number):
+        """The card as a list of 25 cells with '*' in the center"""
+        return [FREE if i == CENTER else cell for i, cell in enumerate(self.raw(card_number))]
+
+    def json_blob(self, first, last):
+        """
+        Cards first..last as compact JSON bytes and their ETag, built once
+        per range. Each card is 25 numbers in row order with 0 for the free
+        center.
+        """
+        key = (first, last)
+        blob = self.blobs.get(key)
+        if blob is None:
+            body = json.dumps({
+                'first': first,
+                'cards': [list(self.raw(n)) for n in range(first, last + 1)]
+            }, separators=(',', ':')).encode()
+            if len(self.blobs) >= MAX_CACHED_BLOBS:
+                self.blobs.clear()
+            blob = self.blobs[key] = (body, hashlib.sha256(body).hexdigest()[:32])
+        return blob
+
+    def masks(self, card_number, patterns=PATTERNS):
+        """The card compiled for the patterns, compiled on first use and kept"""
+        key = tuple(tuple(pattern) for pattern in patterns)
+        compiled = self.compiled.setdefault(key, {})
+        masks = compiled.get(card_number)
+        if masks is None:
+            masks = compiled[card_number] = compile_card(self.card(card_number), patterns)
+        return masks
+
+    def verify(self, card_number, called_numbers, patterns=PATTERNS):
+        """(True, pattern) if the card has a winning pattern, else (False, None)"""
+        if card_number not in self:
+            return False, None
+        pattern = check(self.masks(card_number, patterns), mask(called_numbers))
+        return pattern is not None, pattern
+
+
+_catalog = None
+
+
+def get_catalog():
+    """The process wide catalog from CARD_CATALOG_PATH, or the preset cards"""
+    global _catalog
+    if _catalog is None:
+        from django.conf import settings
+        path = getattr(settings, 'CARD_CATALOG_PATH', None)
+        if path and os.path.exists(path):
+            _catalog = CardCatalog.open(path)
+        else:
+            _catalog = CardCatalog.from_cards(presetCards)
+    return _catalog
@@ -0,0 +1,798 @@
+import asyncio
+import json
+import logging
+import time
+from decimal import Decimal, ROUND_DOWN
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from a_ygame.models import Room, Player, Game
+from a_ygame.arbiter import ClaimArbiter
+from a_ygame.bingo import WinIndex
+from a_ygame.catalog import get_catalog
+from a_ygame.leases import Lease, LEASE_RENEW, LEASE_RETRY
+from a_ygame.schedule import CallSchedule
+from a_ygame.state import get_store
+from a_users.models import Profile
+
+logger = logging.getLogger(__name__)
+
+COUNTDOWN_SECONDS = 30
+COUNTDOWN_CHECK = 1  # seconds between player count checks during the countdown
+CALL_INTERVAL = 3  # seconds between numbers, unless the room sets its own
+MIN_PLAYERS = 2
+RESULT_DELAY = 10  # seconds players get to look at the winning card
+HOUSE_SHARE = Decimal('0.2')  # cut of the pot in rooms of more than 3 players
+CENT = Decimal('0.01')
+CLAIM_WINDOW = 0.5  # seconds claims are collected before the winner is picked
+CLAIM_POLL = 0.1  # seconds between checks for claims queued by other processes
+# The draw cursor is written behind the calls, every few calls or seconds
+CURSOR_FLUSH_CALLS = 5
+CURSOR_FLUSH_SECONDS = 15
+# Selection changes within this many seconds go out as one taken_cards diff
+TAKEN_CARDS_DEBOUNCE = 0.15
+# Margin after a hold's expiry before checking it has lapsed
+HOLD_EXPIRY_MARGIN = 0.05
+
+# Channel the run_game_engine worker listens on
+GAME_ENGINE_CHANNEL = 'game-engine'
+
+# Every socket of a room joins one group. Events tagged with a topic only
+# reach the consumers subscribed to it, untagged events reach all of them.
+TOPIC_GAME = 'game'
+TOPIC_SELECTION = 'selection'
+
+# room_name -> RoomEngine
+engines = {}
+
+
+def room_group(room_name):
+    return f'room_{room_name}'
+
+
+def split_bonus(bonus, count):
+    """
+    Split a bonus into `count` shares of whole cents. The cents that do not
+    divide evenly go to the first winner, the earliest claim.
+    """
+    share = (Decimal(bonus) / count).quantize(CENT, rounding=ROUND_DOWN)
+    return [Decimal(bonus) - share * (count - 1)] + [share] * (count - 1)
+
+
+def get_engine(room_name):
+    """Return the engine driving `room_name`, creating it on first use"""
+    engine = engines.get(room_name)
+    if engine is None:
+        engine = engines[room_name] = RoomEngine(room_name)
+    return engine
+
+
+async def notify_engine(event):
+    """
+    Hand a consumer event to the room engine. With GAME_ENGINE_WORKER enabled
+    the engines live in the run_game_engine process and the event travels over
+    the channel layer, otherwise it is dispatched in this process.
+    """
+    if settings.GAME_ENGINE_WORKER:
+        await get_channel_layer().send(GAME_ENGINE_CHANNEL, event)
+    else:
+        await dispatch(event)
+
+
+async def record_sale(room_name, card_number, previous=None):
+    """
+    A card was bought: mark it taken, free the buyer's previous card if they
+    swapped, and have the room engine send the taken_cards diff.
+    """
+    store = get_store()
+    if previous and previous != card_number:
+        await store.remove_taken(room_name, previous)
+    await store.add_taken(room_name, card_number)
+    await notify_engine({'type': 'engine.taken', 'room_name': room_name})
+
+
+async def dispatch(event):
+    """Route an engine.* event to the engine of its room"""
+    engine = get_engine(event['room_name'])
+    kind = event['type']
+
+    if kind == 'engine.join':
+        await engine.add_player(event['username'])
+    elif kind == 'engine.leave':
+        await engine.remove_player(event['username'])
+    elif kind == 'engine.claim':
+        await engine.claim(event['username'], event.get('reply_channel'))
+    elif kind == 'engine.start':
+        engine.ensure_running()
+    elif kind == 'engine.taken':
+        engine.taken_changed()
+    else:
+        logger.warning(f"Unknown engine event: {kind}")
+
+
+async def run_worker():
+    """Serve engine events from the channel layer until cancelled"""
+    channel_layer = get_channel_layer()
+    store = get_store()
+
+    # Pick up the rooms that were counting down or playing when the worker
+    # stopped, their sockets send no event until someone new connects
+    for room_name in await get_room_names():
+        state = await store.get_state(room_name)
+        if state['phase'] != 'waiting':
+            logger.info(f"Resuming room {room_name} ({state['phase']})")
+            get_engine(room_name).ensure_running()
+
+    while True:
+        event = await channel_layer.receive(GAME_ENGINE_CHANNEL)
+        try:
+            await dispatch(event)
+        except Exception as e:
+            logger.exception(f"Error handling engine event {event.get('type')}: {e}")
+
+
+@database_sync_to_async
+def get_room_names():
+    return list(Room.objects.values_list('room_name', flat=True))
+
+
+def get_bingo_letter(number):
+    """Get the BINGO letter for a given number"""
+    if 1 <= number <= 15:
+        return 'B'
+    elif 16 <= number <= 30:
+        return 'I'
+    elif 31 <= number <= 45:
+        return 'N'
+    elif 46 <= number <= 60:
+        return 'G'
+    elif 61 <= number <= 75:
+        return 'O'
+    return ''
+
+
+class RoomEngine:
+    """
+    Drives a single room: the pre-game countdown, the number calling loop and
+    the settlement of a winning claim. Exactly one driver task runs per room,
+    no matter how many sockets are connected; consumers only subscribe to the
+    room groups and report joins, leaves and claims to the engine.
+
+    Room state lives in the RoomStateStore so every process sees the same
+    players, phase and called numbers. When several processes run engines for
+    the same room, only the holder of the room's Lease drives it; the others
+    keep retrying and take over once the owner stops renewing.
+    """
+
+    def __init__(self, room_name):
+        self.room_name = room_name
+        self.group = room_group(room_name)
+        self.channel_layer = get_channel_layer()
+        self.store = get_store()
+        self.catalog = get_catalog()
+
+        self.task = None
+        self.flushes = set()  # pending write-behind tasks
+        self.sold = {}  # username -> card number in the game being called
+        self.claims_waiting = asyncio.Event()  # set when a claim is queued in this process
+        self.arbiter = None  # ClaimArbiter of the current game
+        self.decision = None  # task closing the claim window
+        self.closed_game = None  # id of the last game this process closed and released
+        self.taken_flush = None  # task sending the next taken_cards diff
+        self.hold_expiry = None  # timer flushing once the next hold lapses
+        self.lease = Lease(room_name)
+
+    # ------------------------------------------------------------------
+    # Subscriber API
+    # ------------------------------------------------------------------
+
+    async def add_player(self, username):
+        """Register a player socket and start the countdown once enough have joined"""
+        count = await self.store.add_player(self.room_name, username)
+        await self.group_send({
+            'type': 'player_count_update',
+            'count': count,
+            'message': f'{username} joined the game.'
+        }, TOPIC_GAME)
+        if count >= MIN_PLAYERS:
+            self.ensure_running()
+
+    async def remove_player(self, username):
+        """Forget a player; reset the room when fewer than two remain"""
+        count = await self.store.remove_player(self.room_name, username)
+
+        await self.group_send({
+            'type': 'player_count_update',
+            'count': count,
+            'message': f'Player left: {username} ({count}/{MIN_PLAYERS})'
+        }, TOPIC_GAME)
+
+        # The driving process resets right away, in other processes the
+        # driver notices the missing players on its next tick
+        if count < MIN_PLAYERS and self.task is not None:
+            state = await self.store.get_state(self.room_name)
+            if state['phase'] in ('countdown', 'playing'):
+                logger.info(f"Less than {MIN_PLAYERS} players remaining in {self.room_name}, resetting game")
+                await self.stop()
+                await self.reset_room('Game reset: Not enough players. Waiting for more players...')
+
+        if count == 0 and self.task is None:
+            engines.pop(self.room_name, None)
+
+    def taken_changed(self):
+        """A card was held, released or taken; send a diff once the changes settle"""
+        if self.taken_flush is None:
+            self.taken_flush = asyncio.create_task(self.flush_taken())
+
+    async def flush_taken(self):
+        """
+        Broadcast one taken_cards diff for everything that changed during the
+        debounce window: the cards `added` and `removed` since version
+        `since`. The store keeps the base the diff is taken against, so
+        engines in different processes agree on it. Holds lapse without an
+        event, so a flush is also due when the next one expires.
+        """
+        try:
+            await asyncio.sleep(TAKEN_CARDS_DEBOUNCE)
+            # Changes from here on schedule the next diff
+            self.taken_flush = None
+            diff, expires = await self.store.publish_taken(self.room_name)
+            if expires:
+                self.flush_at(expires)
+            if diff is None:
+                return
+            await self.group_send({'type': 'taken_cards', **diff}, TOPIC_SELECTION)
+        except Exception as e:
+            logger.error(f"Error sending taken cards of {self.room_name}: {e}")
+        finally:
+            if self.taken_flush is asyncio.current_task():
+                self.taken_flush = None
+
+    def flush_at(self, expires):
+        """Send a diff once the hold expiring at `expires` (epoch seconds) has lapsed"""
+        if self.hold_expiry:
+            self.hold_expiry.cancel()
+        delay = max(0, expires - time.time()) + HOLD_EXPIRY_MARGIN
+        self.hold_expiry = asyncio.get_running_loop().call_later(delay, self.taken_changed)
+
+    def ensure_running(self):
+        """Start the driver task unless one already runs in this process"""
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def claim(self, username, reply_channel):
+        """
+        Queue a bingo claim in the store. Whatever process receives it, only
+        the room's driver checks claims and picks the winner, so every claim
+        of a game is ranked by one arbiter.
+        """
+        state = await self.store.get_state(self.room_name)
+        if state['phase'] != 'playing' or not state['game_id']:
+            await self.reject(reply_channel, 'Game has already ended')
+            return
+        await self.store.push_claim(self.room_name, {
+            'game_id': state['game_id'],
+            'username': username,
+            'reply_channel': reply_channel
+        })
+        # A driver in this process picks it up at once, others on their next poll
+        self.claims_waiting.set()
+
+    async def collect_claims(self, game_id):
+        """Hand the queued claims to the arbiter while this process calls the game"""
+        while True:
+            try:
+                await asyncio.wait_for(self.claims_waiting.wait(), CLAIM_POLL)
+            except asyncio.TimeoutError:
+                pass
+            self.claims_waiting.clear()
+            for claim in await self.store.pop_claims(self.room_name):
+                try:
+                    await self.check_claim(game_id, claim['game_id'], claim['username'], claim['reply_channel'])
+                except Exception as e:
+                    logger.error(f"Error checking the claim of {claim['username']} in {self.room_name}: {e}")
+
+    async def check_claim(self, game_id, claimed_game_id, username, reply_channel):
+        """
+        Check a claim against the player's card and queue it with the game's
+        arbiter, which picks the winner once the claim window closes.
+        """
+        if claimed_game_id != game_id or self.arbiter.closed:
+            await self.reject(reply_channel, 'Game has already ended')
+            return
+
+        # The card comes from the server, never from the client: the cards
+        # entered in the game when it started, bought later they never win
+        card_number = self.sold.get(username)
+        if card_number is None:
+            await self.reject(reply_channel, 'You have no card in this game.')
+            return
+
+        called_numbers = await self.store.get_called(self.room_name)
+        is_valid, _ = self.catalog.verify(card_number, called_numbers, self.arbiter.patterns)
+        if not is_valid:
+            await self.reject(reply_channel, 'Invalid BINGO! No winning pattern found.')
+            return
+
+        claim = self.arbiter.submit(username, card_number, self.catalog.card(card_number), len(called_numbers), reply_channel)
+        if claim is None:
+            await self.reject(reply_channel, 'Your BINGO is already being checked.')
+            return
+
+        if self.decision is None:
+            self.decision = asyncio.create_task(self.arbitrate(CLAIM_WINDOW))
+
+    async def arbitrate(self, window=0):
+        """
+        Wait for the claim window to close, then end the game with the best
+        claims. Returns True if this process closed the game.
+        """
+        try:
+            await asyncio.sleep(window)
+            arbiter = self.arbiter
+            winners = arbiter.decide() if arbiter else []
+            if not winners:
+                return False
+
+            room = await self.get_room()
+            called_numbers = await self.store.get_called(self.room_name)
+            players = [await self.get_player(room, claim.username) for claim in winners]
+
+            # Only one process can flip the game row, a single conditional UPDATE
+            if not await self.close_game(arbiter.game_id, players[0].user, len(called_numbers)):
+                for claim in arbiter.claims:
+                    await self.reject(claim.reply_channel, 'Game has already ended')
+                return False
+
+            for claim in arbiter.losers(winners):
+                await self.reject(claim.reply_channel, f'{players[0].user.username} completed a BINGO first.')
+
+            await self.store.set_state(self.room_name, phase='ended')
+            await self.stop()
+            try:
+                await self.settle(room, list(zip(winners, players)), called_numbers)
+            except Exception as e:
+                logger.error(f"Error settling game {arbiter.game_id} of {self.room_name}: {e}")
+            finally:
+                # The game row is closed whatever happened, the room must move on
+                try:
+                    await self.release_cards()
+                except Exception as e:
+                    logger.error(f"Error releasing the cards of {self.room_name}: {e}")
+                self.closed_game = arbiter.game_id
+                # The result is shown by the driver, under the room lease
+                self.ensure_running()
+            return True
+        finally:
+            if self.decision is asyncio.current_task():
+                self.decision = None
+
+    # ------------------------------------------------------------------
+    # Driver
+    # ------------------------------------------------------------------
+
+    async def run(self):
+        """
+        Take the room lease, then countdown, start the game and call numbers
+        until it ends. Whatever state the last driver left the room in, the
+        new lease holder carries it on or resets it.
+        """
+        heartbeat = None
+        try:
+            if not await self.wait_for_lease():
+                return
+            heartbeat = asyncio.create_task(self.keep_lease(asyncio.current_task()))
+
+            state = await self.store.get_state(self.room_name)
+            if state['phase'] == 'ended':
+                if self.closed_game != state['game_id']:
+                    # The process that closed the game died before resetting the room
+                    logger.warning(f"Room {self.room_name} lost its driver after a win, resetting")
+                    await self.release_cards()
+                await self.finish()
+                return
+            if state['phase'] == 'playing' and state['game_id']:
+                # The previous driver died mid-game, carry on from its cursor
+                logger.warning(f"Room {self.room_name} lost its driver mid-game, resuming")
+            else:
+                if state['phase'] != 'waiting':
+                    logger.warning(f"Room {self.room_name} lost its driver during the countdown, restarting")
+                    await self.reset_room('Game has been reset. Waiting for players...')
+
+                if not await self.run_countdown():
+                    return
+                if not await self.start_game():
+                    return
+
+                # Start calling numbers after a short delay
+                await asyncio.sleep(1)
+            await self.call_numbers()
+
+            # A win settled on a call of this driver is shown before letting go of the room
+            state = await self.store.get_state(self.room_name)
+            if state['phase'] == 'ended' and self.closed_game == state['game_id']:
+                await self.finish()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception(f"Error driving room {self.room_name}: {e}")
+            await self.reset_room()
+        finally:
+            if self.task is asyncio.current_task():
+                self.task = None
+            if heartbeat:
+                heartbeat.cancel()
+                try:
+                    await self.lease.release()
+                except Exception as e:
+                    logger.error(f"Error releasing lease for room {self.room_name}: {e}")
+
+    async def wait_for_lease(self):
+        """Wait until this process owns the room, False if it emptied meanwhile"""
+        while not await self.lease.acquire():
+            if await self.store.player_count(self.room_name) < MIN_PLAYERS:
+                return False
+            await asyncio.sleep(LEASE_RETRY)
+        return True
+
+    async def keep_lease(self, driver):
+        """Renew the lease while driving, stop the driver if it is lost"""
+        while True:
+            await asyncio.sleep(LEASE_RENEW)
+            try:
+                renewed = await self.lease.renew()
+            except Exception as e:
+                logger.error(f"Error renewing lease for room {self.room_name}: {e}")
+                renewed = False
+            if not renewed:
+                logger.warning(f"Lost the lease on room {self.room_name}, stopping the driver")
+                driver.cancel()
+                return
+
+    async def enough_players(self):
+        return await self.store.player_count(self.room_name) >= MIN_PLAYERS
+
+    async def run_countdown(self):
+        """
+        Count down to the game start, returns True if the game should start.
+        The deadline is kept on the monotonic loop clock and broadcast once,
+        as epoch seconds; clients render the countdown themselves.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + COUNTDOWN_SECONDS
+        starts_at = time.time() + COUNTDOWN_SECONDS
+        await self.store.set_state(self.room_name, phase='countdown', starts_at=starts_at)
+        await self.send_countdown(starts_at)
+
+        while loop.time() < deadline:
+            if not await self.enough_players():
+                await self.reset_room('Game reset: Not enough players. Waiting for more players...')
+                return False
+            await asyncio.sleep(min(COUNTDOWN_CHECK, deadline - loop.time()))
+        return True
+
+    async def send_countdown(self, starts_at):
+        """Broadcast the countdown deadline, None when the countdown is called off"""
+        event = {
+            'type': 'countdown_update',
+            'starts_at': starts_at,
+            'now': time.time(),
+            'message': 'Game starting soon...' if starts_at else 'Countdown stopped. Waiting for more players...'
+        }
+        await self.group_send(event)
+
+    async def start_game(self):
+        """Create the game row and tell the room it has started"""
+        room = await self.get_room()
+        if not room:
+            await self.reset_room()
+            return False
+
+        game = await self.create_game(room)
+        await self.store.set_state(self.room_name, phase='playing', game_id=game.pk)
+        logger.info(f"Countdown finished in {self.room_name}, starting game {game.pk}")
+
+        await self.group_send({
+            'type': 'game_started',
+            'message': 'Game started! No more players can join or select cards.'
+        })
+        return True
+
+    async def call_numbers(self):
+        """
+        Call the game's pre-drawn numbers. The store holds the authoritative
+        draw, the database cursor is flushed behind it in batches so a call
+        never waits on the database.
+        """
+        state = await self.store.get_state(self.room_name)
+        game_id = state['game_id']
+        game = await self.get_game(game_id)
+        if game is None or not game.is_active:
+            # The game was closed but the room never moved on
+            await self.release_cards()
+            await self.reset_room('Game has been reset. Waiting for players...')
+            return
+
+        sequence = game.sequence
+        called = await self.store.get_called(self.room_name)
+        # Numbers the database has but the store lost
+        for number in sequence[len(called):game.cursor]:
+            await self.store.push_called(self.room_name, number)
+        start = max(len(called), game.cursor)
+
+        # Index every card sold in the game to spot winners as numbers are called
+        # The room's winning patterns, compiled once per process
+        patterns = game.room.winning_patterns()
+        sold = await self.get_sold_cards(game_id)
+        self.sold = {username: card_number for card_number, username in sold.items()}
+        self.arbiter = ClaimArbiter(game_id, sequence, settings.BINGO_TIE_RULE, patterns)
+        win_index = WinIndex(patterns)
+        for card_number in sold:
+            win_index.add_card(card_number, self.catalog.card(card_number))
+        for number in sequence[:start]:
+            win_index.call(number)
+
+        calls = start
+        flushed = game.cursor
+        flushed_at = time.monotonic()
+        interval = game.room.call_interval or CALL_INTERVAL
+        schedule = CallSchedule(interval)
+        collector = asyncio.create_task(self.collect_claims(game_id))
+        try:
+            for cursor in range(start, len(sequence)):
+                # Calls fire at fixed slots, whatever the previous call cost
+                late = await schedule.wait()
+                if late > interval / 2:
+                    logger.warning(f"Call {cursor + 1} of game {game_id} fired {late * 1000:.0f} ms late")
+
+                state = await self.store.get_state(self.room_name)
+                if state['phase'] != 'playing':
+                    break
+                if not await self.enough_players():
+                    await self.reset_room('Game reset: Not enough players. Waiting for more players...')
+                    break
+
+                number = sequence[cursor]
+                await self.store.push_called(self.room_name, number)
+                calls = cursor + 1
+
+                # Only the new number; clients that miss one ask for the gap
+                await self.group_send({
+                    'type': 'number_called',
+                    'seq': calls,
+                    'number': number
+                }, TOPIC_GAME)
+
+                completed = win_index.call(number)
+                if completed:
+                    if settings.BINGO_AUTO_SETTLE:
+                        # Settle every card completed on this call as if its holder claimed it
+                        for card_number, _ in completed:
+                            self.arbiter.submit(sold[card_number], card_number, self.catalog.card(card_number), calls)
+                        if await self.arbitrate():
+                            break
+                    else:
+                        # Let the holders know they can claim
+                        card_numbers = sorted({card_number for card_number, _ in completed})
+                        await self.group_send({
+                            'type': 'bingo_available',
+                            'card_numbers': card_numbers
+                        }, TOPIC_GAME, card_numbers=card_numbers)
+
+                if calls - flushed >= CURSOR_FLUSH_CALLS or time.monotonic() - flushed_at >= CURSOR_FLUSH_SECONDS:
+                    flushed = calls
+                    flushed_at = time.monotonic()
+                    self.write_behind(game_id, flushed)
+            else:
+                # The draw ran out: give claims on the last call one more
+                # slot, then close the game without a winner
+                await schedule.wait()
+                if await self.close_game(game_id, None, calls):
+                    await self.release_cards()
+                    await self.reset_room('Game over: every number was called without a BINGO. Waiting for players...')
+        finally:
+            collector.cancel()
+            stats = schedule.stats()
+            logger.info(
+                f"Game {game_id}: {stats['ticks']} calls every {interval} s, "
+                f"lateness mean {stats['mean'] * 1000:.1f} ms, max {stats['max'] * 1000:.1f} ms"
+            )
+            # Always flush what was called when the game stops
+            try:
+                await self.save_cursor(game_id, calls)
+            except Exception as e:
+                logger.error(f"Error flushing the draw cursor of game {game_id}: {e}")
+
+    def write_behind(self, game_id, cursor):
+        """Save the cursor in the background"""
+        async def flush():
+            try:
+                await self.save_cursor(game_id, cursor)
+            except Exception as e:
+                logger.error(f"Error flushing the draw cursor of game {game_id}: {e}")
+        task = asyncio.create_task(flush())
+        self.flushes.add(task)
+        task.add_done_callback(self.flushes.discard)
+
+    async def settle(self, room, winners, called_numbers):
+        """Pay the winners' bonus, [(claim, player)], and broadcast the result"""
+        player_count = await self.store.player_count(self.room_name)
+        total_stake = room.stake * player_count
+        if player_count <= 3:
+            bonus = total_stake
+        else:
+            bonus = (total_stake * (1 - HOUSE_SHARE)).quantize(CENT)
+        shares = split_bonus(bonus, len(winners))
+
+        for (claim, player), share in zip(winners, shares):
+            balance = await self.credit_winner(player.user, share)
+            # To every game socket of the winner, auto-settled wins have no claim to reply to
+            await self.group_send({
+                'type': 'balance_update',
+                'balance': str(balance)
+            }, TOPIC_GAME, username=player.user.username)
+
+        claim, player = winners[0]
+        usernames = [player.user.username for _, player in winners]
+        game_over_data = {
+            'type': 'game_ended',
+            'winner': ', '.join(usernames),
+            'winners': usernames,
+            'card_number': claim.card_number,
+            'card_numbers': self.catalog.card(claim.card_number),
+            'called_numbers': called_numbers,
+            'bonus': str(shares[0]),
+            'shares': {player.user.username: str(share) for (_, player), share in zip(winners, shares)},
+            'total_stake': str(total_stake),
+            'player_count': player_count,
+            'winning_pattern': claim.pattern,
+            'message': f'{", ".join(usernames)} has won the game!'
+        }
+        await self.group_send(game_over_data)
+        await self.group_send({
+            'type': 'play_sound',
+            'sound': 'bingo'
+        }, TOPIC_GAME)
+
+    async def release_cards(self):
+        """
+        Free every card of the room for the next game: one UPDATE for the
+        sold cards, one store reset for the held and taken ones and a single
+        cards_released broadcast to the selection screen.
+        """
+        await self.clear_card_numbers()
+        await self.store.reset_cards(self.room_name)
+        version = await self.store.bump_taken_version(self.room_name)
+        await self.group_send({
+            'type': 'cards_released',
+            'version': version,
+            'message': 'Game has ended. All cards are now available for selection.'
+        }, TOPIC_SELECTION)
+
+    async def finish(self):
+        """Give players time to see the result, then reset the room"""
+        try:
+            await asyncio.sleep(RESULT_DELAY)
+            await self.reset_room('Game has been reset. Waiting for players...')
+            await self.group_send({
+                'type': 'game_ended',
+                'message': 'Game reset: All cards are now available for selection.'
+            }, TOPIC_SELECTION)
+        finally:
+            if not await self.store.player_count(self.room_name):
+                engines.pop(self.room_name, None)
+
+    async def stop(self):
+        """Cancel the driver task unless it is the caller"""
+        task = self.task
+        if task is None or task is asyncio.current_task():
+            return
+        self.task = None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def reset_room(self, message=None):
+        """Put the room back to waiting, telling the game page why if given a message"""
+        state = await self.store.get_state(self.room_name)
+        await self.store.reset_game(self.room_name)
+        if state['phase'] == 'countdown':
+            await self.send_countdown(None)
+        self.sold = {}
+        self.arbiter = None
+        if message:
+            await self.group_send({
+                'type': 'game_reset',
+                'message': message
+            }, TOPIC_GAME)
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    async def group_send(self, frame, topic=None, **fields):
+        """
+        Send a client frame to the room group, to the consumers of `topic`
+        only if given. The frame is serialized here, once, and every consumer
+        passes the text through; `fields` go along for consumers that filter.
+        """
+        event = {'type': frame['type'], 'text': json.dumps(frame), **fields}
+        if topic:
+            event['topic'] = topic
+        await self.channel_layer.group_send(self.group, event)
+
+    async def reply(self, channel_name, event):
+        if channel_name:
+            await self.channel_layer.send(channel_name, event)
+
+    async def reject(self, channel_name, message):
+        await self.reply(channel_name, {
+            'type': 'claim_rejected',
+            'message': message
+        })
+
+    @database_sync_to_async
+    def get_room(self):
+        try:
+            return Room.objects.get(room_name=self.room_name)
+        except Room.DoesNotExist:
+            return None
+
+    @database_sync_to_async
+    def get_player(self, room, username):
+        return Player.objects.select_related('user').get(room=room, user__username=username)
+
+    @database_sync_to_async
+    def get_sold_cards(self, game_id):
+        """{card_number: username} of the catalog cards entered in the game"""
+        players = Player.objects.filter(
+            room__room_name=self.room_name,
+            game_id=game_id,
+            card_number__gte=1,
+            card_number__lte=len(self.catalog)
+        ).values_list('card_number', 'user__username')
+        return dict(players)
+
+    @database_sync_to_async
+    def clear_card_numbers(self):
+        return Player.objects.filter(
+            room__room_name=self.room_name, card_number__isnull=False
+        ).update(card_number=None)
+
+    @database_sync_to_async
+    def create_game(self, room):
+        """
+        End any active games for the room and create a fresh one, entering
+        the cards sold so far in it
+        """
+        with transaction.atomic():
+            Game.objects.filter(room=room, is_active=True).update(is_active=False)
+            game = Game.objects.create(room=room)
+            Player.objects.filter(room=room, card_number__isnull=False).update(game=game)
+        return game
+
+    @database_sync_to_async
+    def get_game(self, game_id):
+        return Game.objects.select_related('room').filter(pk=game_id).first()
+
+    @database_sync_to_async
+    def save_cursor(self, game_id, cursor):
+        """Move the cursor forward, late batches never move it back"""
+        Game.objects.filter(pk=game_id, is_active=True, cursor__lt=cursor).update(cursor=cursor)
+
+    @database_sync_to_async
+    def close_game(self, game_id, winner, cursor):
+        """End the game with a winner, False if it had already ended"""
+        return Game.objects.filter(pk=game_id, is_active=True).update(
+            is_active=False, winner=winner, cursor=cursor
+        ) == 1
+
+    @database_sync_to_async
+    def credit_winner(self, user, bonus):
+        Profile.objects.filter(user=user).update(balance=F('balance') + bonus)
+        return Profile.objects.get(user=user).balance
@@ -0,0 +1,57 @@
+import os
+import socket
+import uuid
+from datetime import timedelta
+
+from channels.db import database_sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from a_ygame.models import RoomLease
+
+LEASE_TTL = 15  # seconds a lease stays valid without renewal
+LEASE_RENEW = 5  # seconds between renewals while driving
+LEASE_RETRY = 5  # seconds between takeover attempts while another process drives
+
+# Identifies this process as a lease owner
+ENGINE_ID = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class Lease:
+    """
+    Ownership of one room's driver across processes, stored as a RoomLease
+    row. Acquiring succeeds when the row is missing, already ours or expired,
+    all in a single conditional UPDATE/INSERT, so two processes can never both
+    hold it. If the owner dies it stops renewing and another process takes
+    over once the lease expires.
+    """
+
+    def __init__(self, room_name, owner=ENGINE_ID, ttl=LEASE_TTL):
+        self.room_name = room_name
+        self.owner = owner
+        self.ttl = ttl
+
+    @database_sync_to_async
+    def acquire(self):
+        """Take or renew the lease, returns True if we hold it afterwards"""
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.ttl)
+
+        updated = RoomLease.objects.filter(room_name=self.room_name).filter(
+            Q(owner=self.owner) | Q(expires_at__lt=now)
+        ).update(owner=self.owner, expires_at=expires_at)
+        if updated:
+            return True
+
+        try:
+            with transaction.atomic():
+                RoomLease.objects.create(room_name=self.room_name, owner=self.owner, expires_at=expires_at)
+            return True
+        except IntegrityError:
+            return False
+
+    renew = acquire
+
+    @database_sync_to_async
+    def release(self):
+        RoomLease.objects.filter(room_name=self.room_name, owner=self.owner).delete()
@@ -0,0 +1,109 @@
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from a_ygame.bingo import get_patterns, PATTERN_SETS
+from a_ygame.catalog import get_catalog
+from a_ygame.models import Room
+from a_ygame.simulation import simulate, overlap_matrix, histogram_stats
+from a_ygame.vectorized import card_matrix
+
+class Command(BaseCommand):
+    help = 'Simulates games over the card catalog to report card fairness, card overlap and game length'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=100000,
+                            help='Number of games to simulate')
+        parser.add_argument('--room', help='Use the cards and winning patterns of this room')
+        parser.add_argument('--patterns', default='classic', choices=sorted(PATTERN_SETS),
+                            help='Pattern set when no room is given')
+        parser.add_argument('--cards', type=int,
+                            help='Simulate catalog cards 1..N (default: the room\'s cards or the whole catalog)')
+        parser.add_argument('--players', default='2,5,10,20,50,100',
+                            help='Comma separated player counts to report the game length for')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Simulation processes')
+        parser.add_argument('--overlap-cards', type=int, default=2000,
+                            help='Compare at most this many cards pairwise')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--csv', help='Write per card statistics to this file')
+
+    def handle(self, *args, **options):
+        catalog = get_catalog()
+        if options['room']:
+            try:
+                room = Room.objects.get(room_name=options['room'])
+            except Room.DoesNotExist:
+                raise CommandError(f"Room {options['room']} does not exist")
+            patterns = room.winning_patterns()
+            count = options['cards'] or room.available_card_count()
+        else:
+            patterns = get_patterns(options['patterns'])
+            count = options['cards'] or len(catalog)
+        count = min(count, len(catalog))
+        if not patterns:
+            raise CommandError('No winning patterns to simulate')
+
+        cards = card_matrix(catalog.card(n) for n in range(1, count + 1))
+        player_counts = [int(n) for n in options['players'].split(',')]
+        workers = max(1, options['workers'])
+        games = options['games']
+
+        self.stdout.write(f'Simulating {games} games over {count} cards with {workers} workers...')
+        started = time.perf_counter()
+
+        win_hist = np.zeros((count, 76), dtype=np.int64)
+        length_hist = {}
+        shares = [games // workers + (1 if i < games % workers else 0) for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(simulate, cards, patterns, share, options['seed'] + i, player_counts)
+                for i, share in enumerate(shares) if share
+            ]
+            for future in futures:
+                hist, lengths = future.result()
+                win_hist += hist
+                for players, counts in lengths.items():
+                    length_hist[players] = length_hist.get(players, 0) + counts
+
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f} s'))
+
+        # First win per card
+        stats = [histogram_stats(hist) for hist in win_hist]
+        means = np.array([s['mean'] for s in stats])
+        order = np.argsort(means)
+        self.stdout.write('\nCall index at which a card first wins')
+        self.stdout.write(f'  mean over cards {means.mean():.2f}, spread {means.min():.2f} - {means.max():.2f}')
+        for label, picks in (('earliest', order[:5]), ('latest', order[::-1][:5])):
+            summary = ', '.join(f'#{i + 1} {means[i]:.2f}' for i in picks)
+            self.stdout.write(f'  {label}: {summary}')
+
+        # Pairwise overlap
+        compared = min(count, options['overlap_cards'])
+        if compared > 1:
+            overlap = overlap_matrix(cards[:compared])
+            upper = np.triu_indices(compared, k=1)
+            shared = overlap[upper]
+            self.stdout.write(f'\nNumbers shared by two cards ({compared} cards compared)')
+            self.stdout.write(f'  mean {shared.mean():.2f}, max {shared.max()}')
+            for at in np.argsort(shared)[::-1][:5]:
+                self.stdout.write(f'  #{upper[0][at] + 1} and #{upper[1][at] + 1} share {shared[at]}')
+
+        # Game length
+        self.stdout.write('\nGame length (calls until the first win)')
+        for players in sorted(length_hist):
+            s = histogram_stats(length_hist[players])
+            self.stdout.write(
+                f"  {players:>4} players: mean {s['mean']:.2f}, "
+                f"p10 {s['p10']}, median {s['p50']}, p90 {s['p90']}"
+            )
+
+        if options['csv']:
+            with open(options['csv'], 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['card_number', 'mean', 'p10', 'p50', 'p90'])
+                for number, s in enumerate(stats, start=1):
+                    writer.writerow([number, f"{s['mean']:.3f}", s['p10'], s['p50'], s['p90']])
+            self.stdout.write(f"\nWrote per card statistics to {options['csv']}")
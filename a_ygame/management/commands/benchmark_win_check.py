@@ -0,0 +1,51 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from a_ygame.bingo import verify_bingo, compile_card, check, mask
+from a_ygame.cards import presetCards
+from a_ygame.vectorized import card_matrix, pattern_matrix, winning_cards
+
+class Command(BaseCommand):
+    help = 'Compares per-card win checks with the vectorized whole-room evaluator'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,10000,100000',
+                            help='Comma separated card counts to time')
+        parser.add_argument('--calls', type=int, default=30,
+                            help='How many numbers are called when the cards are checked')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        called = rng.sample(range(1, 76), options['calls'])
+        patterns = pattern_matrix()
+
+        for size in [int(n) for n in options['sizes'].split(',')]:
+            cards = rng.choices(presetCards, k=size)
+
+            started = time.perf_counter()
+            loop_winners = sum(verify_bingo(card, called)[0] for card in cards)
+            loop_time = time.perf_counter() - started
+
+            compiled = [compile_card(card) for card in cards]
+            called_mask = mask(called)
+            started = time.perf_counter()
+            mask_winners = sum(check(card, called_mask) is not None for card in compiled)
+            mask_time = time.perf_counter() - started
+
+            matrix = card_matrix(cards)
+            started = time.perf_counter()
+            numpy_winners = int(winning_cards(matrix, called, patterns).sum())
+            numpy_time = time.perf_counter() - started
+
+            if not loop_winners == mask_winners == numpy_winners:
+                self.stderr.write(self.style.ERROR(
+                    f'{size} cards: winners differ ({loop_winners}, {mask_winners}, {numpy_winners})'
+                ))
+
+            self.stdout.write(
+                f'{size:>7} cards, {loop_winners} winners: '
+                f'python loop {loop_time * 1000:.2f} ms, '
+                f'bitmask {mask_time * 1000:.2f} ms, '
+                f'numpy {numpy_time * 1000:.2f} ms'
+            )
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from a_ygame.cards import presetCards
+from a_ygame.catalog import generate_cards, write_catalog, CARD_SIZE
+
+class Command(BaseCommand):
+    help = 'Generates the binary card catalog rooms sell their cards from'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000,
+                            help='Number of cards in the catalog')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Generator seed, the same seed gives the same cards')
+        parser.add_argument('--output', default=str(settings.CARD_CATALOG_PATH),
+                            help='Catalog file to write')
+        parser.add_argument('--no-presets', action='store_true',
+                            help='Do not keep the preset cards as the first card numbers')
+
+    def handle(self, *args, **options):
+        start = () if options['no_presets'] else presetCards
+        cards = generate_cards(options['count'], options['seed'], start)
+        write_catalog(options['output'], cards)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(cards)} cards ({len(cards) * CARD_SIZE} bytes) to {options['output']}"
+        ))
+        self.stdout.write('Restart the web and engine processes to load it')
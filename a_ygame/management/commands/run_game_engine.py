@@ -0,0 +1,13 @@
+import asyncio
+from django.core.management.base import BaseCommand
+from a_ygame.engine import run_worker
+
+class Command(BaseCommand):
+    help = 'Runs the headless game engine that drives countdowns, number calls and wins for every room'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Starting game engine...'))
+        try:
+            asyncio.run(run_worker())
+        except KeyboardInterrupt:
+            self.stdout.write('Game engine stopped')
@@ -0,0 +1,50 @@
+import random
+
+import a_ygame.models
+from django.db import migrations, models
+
+
+def seed_existing_games(apps, schema_editor):
+    """
+    Give every existing game its own seed and keep its recorded draw as the
+    legacy draw, with the cursor at its end, so old games can still be
+    replayed.
+    """
+    Game = apps.get_model('a_ygame', 'Game')
+    rng = random.SystemRandom()
+    for game in Game.objects.all():
+        game.seed = rng.getrandbits(63)
+        game.cursor = len(game.legacy_called_numbers or [])
+        game.save(update_fields=['seed', 'cursor'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('a_ygame', '0002_roomlease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='seed',
+            field=models.BigIntegerField(default=a_ygame.models.new_seed),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='cursor',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        # The recorded draw of games created before seeded draws is kept
+        migrations.RenameField(
+            model_name='game',
+            old_name='called_numbers',
+            new_name='legacy_called_numbers',
+        ),
+        migrations.AlterField(
+            model_name='game',
+            name='legacy_called_numbers',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(seed_existing_games, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('a_ygame', '0003_game_seed_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='pattern_set',
+            field=models.CharField(choices=[('classic', 'Any line or four corners'), ('line', 'Any line'), ('four_corners', 'Four corners'), ('x', 'X (both diagonals)'), ('full_house', 'Full house'), ('custom', 'Custom patterns')], default='classic', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='custom_patterns',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
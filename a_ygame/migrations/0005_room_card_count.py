@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('a_ygame', '0004_room_patterns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='card_count',
+            field=models.PositiveIntegerField(default=100),
+        ),
+    ]
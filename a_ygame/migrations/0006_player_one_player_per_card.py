@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+def release_duplicate_cards(apps, schema_editor):
+    """Keep the earliest player on a card, release it for the others"""
+    Player = apps.get_model('a_ygame', 'Player')
+    seen = set()
+    for player in Player.objects.exclude(card_number__isnull=True).order_by('joined_at', 'pk'):
+        key = (player.room_id, player.card_number)
+        if key in seen:
+            player.card_number = None
+            player.save(update_fields=['card_number'])
+        seen.add(key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('a_ygame', '0005_room_card_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(release_duplicate_cards, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='player',
+            constraint=models.UniqueConstraint(condition=models.Q(('card_number__isnull', False)), fields=('room', 'card_number'), name='one_player_per_card'),
+        ),
+    ]
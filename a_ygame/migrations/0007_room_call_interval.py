@@ -0,0 +1,17 @@
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('a_ygame', '0006_player_one_player_per_card'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='call_interval',
+            field=models.FloatField(default=3, validators=[django.core.validators.MinValueValidator(0.5)]),
+        ),
+    ]
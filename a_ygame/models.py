@@ -1,9 +1,25 @@
+import random
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.contrib.auth.models import User
 
 from django.utils import timezone
 
+from a_ygame.bingo import get_patterns
+from a_ygame.catalog import get_catalog
+
 class Room(models.Model):
+    PATTERN_SET_CHOICES = [
+        ('classic', 'Any line or four corners'),
+        ('line', 'Any line'),
+        ('four_corners', 'Four corners'),
+        ('x', 'X (both diagonals)'),
+        ('full_house', 'Full house'),
+        ('custom', 'Custom patterns'),
+    ]
+
     room_name = models.CharField(max_length=100, unique=True)
     stake = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     is_active = models.BooleanField(default=True)
@@ -11,6 +27,27 @@ class Room(models.Model):
     time_left = models.IntegerField(default=30)
     timer_started = models.BooleanField(default=False)
     current_players = models.ManyToManyField(User, through='Player', related_name='rooms')
+    pattern_set = models.CharField(max_length=20, choices=PATTERN_SET_CHOICES, default='classic')
+    # For 'custom': card index lists or 25 character '0'/'1' masks
+    custom_patterns = models.JSONField(default=list, blank=True)
+    # Cards 1..card_count of the card catalog are for sale in this room
+    card_count = models.PositiveIntegerField(default=100)
+    # Seconds between called numbers, lower for express rooms
+    call_interval = models.FloatField(default=3, validators=[MinValueValidator(0.5)])
+
+    def clean(self):
+        super().clean()
+        if self.pattern_set == 'custom':
+            try:
+                get_patterns(self.pattern_set, self.custom_patterns)
+            except ValueError as e:
+                raise ValidationError({'custom_patterns': str(e)})
+
+    def winning_patterns(self):
+        return get_patterns(self.pattern_set, self.custom_patterns)
+
+    def available_card_count(self):
+        return min(self.card_count, len(get_catalog()))
 
     def __str__(self):
         return self.room_name
@@ -33,15 +70,38 @@ class Player(models.Model):
 
     class Meta:
         unique_together = ('user', 'room')
+        constraints = [
+            # A card is sold once per room
+            models.UniqueConstraint(
+                fields=['room', 'card_number'],
+                condition=models.Q(card_number__isnull=False),
+                name='one_player_per_card'
+            )
+        ]
 
     def __str__(self):
         return f"{self.user.username} in {self.room.room_name}"
 
+def new_seed():
+    return random.SystemRandom().getrandbits(63)
+
+
+def draw_sequence(seed):
+    """The order in which a game with this seed calls the 75 numbers"""
+    numbers = list(range(1, 76))
+    random.Random(seed).shuffle(numbers)
+    return numbers
+
+
 class Game(models.Model):
     room = models.ForeignKey(Room, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
-    called_numbers = models.JSONField(default=list)
+    # The whole draw is fixed by the seed, the cursor counts the numbers called
+    seed = models.BigIntegerField(default=new_seed)
+    cursor = models.PositiveSmallIntegerField(default=0)
+    # The recorded draw of games created before seeded draws, None for newer games
+    legacy_called_numbers = models.JSONField(null=True, blank=True, editable=False)
     winner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     timer_started = models.BooleanField(default=False)
     time_left = models.IntegerField(default=30)
@@ -56,11 +116,35 @@ class Game(models.Model):
         ]
 
     def save(self, *args, **kwargs):
-        # Ensure only one active game per room
-        if self.is_active:
+        # Ensure only one active game per room, unless only other columns are saved
+        update_fields = kwargs.get('update_fields')
+        if self.is_active and (update_fields is None or 'is_active' in update_fields):
             Game.objects.filter(room=self.room, is_active=True).exclude(pk=self.pk).update(is_active=False)
         super().save(*args, **kwargs)
 
+    @property
+    def sequence(self):
+        sequence = draw_sequence(self.seed)
+        if self.legacy_called_numbers:
+            # The recorded draw first, then the remaining numbers in seeded order
+            legacy = list(self.legacy_called_numbers)
+            sequence = legacy + [number for number in sequence if number not in legacy]
+        return sequence
+
+    @property
+    def called_numbers(self):
+        return self.sequence[:self.cursor]
+
     def __str__(self):
         return f"Game in {self.room.room_name} at {self.created_at}"
 
+
+
+class RoomLease(models.Model):
+    """Which engine process currently drives a room, see a_ygame.leases"""
+    room_name = models.CharField(max_length=100, unique=True)
+    owner = models.CharField(max_length=100)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.room_name} driven by {self.owner} until {self.expires_at}"
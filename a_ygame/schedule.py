@@ -0,0 +1,44 @@
+"""
+Fixed-rate scheduling of number calls. Plain Python, no Django imports.
+
+Tick k is due at t0 + k * interval on the event loop's monotonic clock, so
+the time spent sending a call or touching the store is absorbed by the next
+wait instead of stretching the game.
+"""
+import asyncio
+
+
+class CallSchedule:
+    """Waits for each call's slot and records how late every tick fired"""
+
+    def __init__(self, interval, loop=None):
+        self.loop = loop or asyncio.get_running_loop()
+        self.interval = interval
+        self.t0 = self.loop.time()
+        self.ticks = 0
+        self.lateness = []  # seconds each tick fired after its slot
+
+    async def wait(self):
+        """Sleep until the next slot, returns how late it fired in seconds"""
+        due = self.t0 + self.ticks * self.interval
+        delay = due - self.loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        late = max(0.0, self.loop.time() - due)
+        self.lateness.append(late)
+        if late > self.interval:
+            # The host stalled for a whole interval: carry on from now rather
+            # than firing the missed calls back to back
+            self.t0 += late
+        self.ticks += 1
+        return late
+
+    def stats(self):
+        """Tick count and mean / max lateness in seconds"""
+        if not self.lateness:
+            return {'ticks': 0, 'mean': 0.0, 'max': 0.0}
+        return {
+            'ticks': len(self.lateness),
+            'mean': sum(self.lateness) / len(self.lateness),
+            'max': max(self.lateness),
+        }
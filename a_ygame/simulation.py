@@ -0,0 +1,90 @@
+"""
+Monte Carlo simulation of games over a card catalog, with NumPy.
+
+A batch of draws is a (games x 75) matrix of permutations of 1..75. Turning
+it into the call index of every number lets each card's cells be looked up
+at once, and a card first wins at the smallest, over its patterns, of the
+largest call index among the pattern's cells.
+"""
+import numpy as np
+
+from a_ygame.bingo import CENTER
+
+# Cap on games x cards per batch, keeps the (games x cards x 25) lookup small
+BATCH_CELLS = 2_000_000
+
+
+def random_draws(rng, games):
+    """(games x 75) uint8 matrix, each row a random calling order"""
+    draws = np.tile(np.arange(1, 76, dtype=np.uint8), (games, 1))
+    return rng.permuted(draws, axis=1)
+
+
+def first_wins(cards, patterns, draws):
+    """
+    (games x cards) call index (1-75) at which each card first completes
+    one of the patterns, for a card_matrix and a batch of draws.
+    """
+    games = draws.shape[0]
+    call_index = np.zeros((games, 76), dtype=np.uint8)  # number 0 is the free center
+    call_index[np.arange(games)[:, None], draws] = np.arange(1, 76, dtype=np.uint8)
+    called_at = call_index[:, cards]  # (games x cards x 25)
+
+    wins = None
+    for pattern in patterns:
+        cells = [i for i in pattern if i != CENTER]
+        at = called_at[:, :, cells].max(axis=2)
+        wins = at if wins is None else np.minimum(wins, at)
+    return wins
+
+
+def simulate(cards, patterns, games, seed, player_counts):
+    """
+    Play `games` random draws. Returns a (cards x 76) histogram of the call
+    index at which each card first wins, and {players: 76 bin histogram of
+    game lengths} for games between that many random distinct cards.
+    """
+    rng = np.random.default_rng(seed)
+    count = len(cards)
+    win_hist = np.zeros((count, 76), dtype=np.int64)
+    length_hist = {players: np.zeros(76, dtype=np.int64) for players in player_counts if players <= count}
+    batch = max(1, min(1000, BATCH_CELLS // count))
+
+    for start in range(0, games, batch):
+        size = min(batch, games - start)
+        wins = first_wins(cards, patterns, random_draws(rng, size))
+
+        flat = (np.arange(count) * 76)[None, :] + wins
+        win_hist += np.bincount(flat.ravel(), minlength=count * 76).reshape(count, 76)
+
+        for players, hist in length_hist.items():
+            # `players` distinct cards per game, the game ends with the first winner
+            picks = np.argpartition(rng.random((size, count)), players - 1, axis=1)[:, :players]
+            length = np.take_along_axis(wins, picks, axis=1).min(axis=1)
+            hist += np.bincount(length, minlength=76)
+
+    return win_hist, length_hist
+
+
+def overlap_matrix(cards):
+    """(cards x cards) count of numbers each pair of cards shares"""
+    membership = np.zeros((len(cards), 76), dtype=np.float32)
+    membership[np.arange(len(cards))[:, None], cards] = 1
+    membership[:, 0] = 0  # the free center is not a number
+    return (membership @ membership.T).astype(np.int32)
+
+
+def histogram_stats(hist):
+    """Mean and 10th, 50th and 90th percentile of a histogram over call indexes"""
+    total = hist.sum()
+    if not total:
+        return None
+    index = np.arange(len(hist))
+    cumulative = np.cumsum(hist) / total
+    percentile = lambda q: int(np.searchsorted(cumulative, q))
+    return {
+        'mean': float((index * hist).sum() / total),
+        'p10': percentile(0.1),
+        'p50': percentile(0.5),
+        'p90': percentile(0.9),
+    }
@@ -0,0 +1,515 @@
+import json
+import time
+
+from django.conf import settings
+
+# Seconds a card stays held for a player on the selection screen unless renewed
+CARD_HOLD_TTL = 30
+# Seconds a player counts as present unless their game socket refreshes it,
+# so the players of a process that died drop out on their own
+PRESENCE_TTL = 30
+PRESENCE_REFRESH = 10
+
+# Atomically hold a card: KEYS[1] the selected hash, KEYS[2] the taken set,
+# ARGV card, username, now, ttl. Sold cards cannot be held.
+RESERVE_SCRIPT = """
+if redis.call('SISMEMBER', KEYS[2], ARGV[1]) == 1 then
+    return 0
+end
+local held = redis.call('HGET', KEYS[1], ARGV[1])
+if held then
+    local sep = string.find(held, '|', 1, true)
+    local owner = string.sub(held, 1, sep - 1)
+    local expires = tonumber(string.sub(held, sep + 1))
+    if owner ~= ARGV[2] and expires > tonumber(ARGV[3]) then
+        return 0
+    end
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2] .. '|' .. (tonumber(ARGV[3]) + tonumber(ARGV[4])))
+return 1
+"""
+
+# Release a card only if it is held by ARGV username
+RELEASE_SCRIPT = """
+local held = redis.call('HGET', KEYS[1], ARGV[1])
+if held and string.sub(held, 1, string.len(ARGV[2]) + 1) == ARGV[2] .. '|' then
+    return redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+# Diff the unavailable cards (live holds and taken cards) against the ones
+# last broadcast and make them the new base, atomically. KEYS[1] the selected
+# hash, KEYS[2] the taken set, KEYS[3] the published set, KEYS[4] the version,
+# KEYS[5] a scratch set; ARGV[1] now. Returns {since, version, added, removed,
+# next hold expiry or ''}, version 0 when nothing changed.
+PUBLISH_TAKEN_SCRIPT = """
+local now = tonumber(ARGV[1])
+local next_expiry = false
+redis.call('DEL', KEYS[5])
+local held = redis.call('HGETALL', KEYS[1])
+for i = 1, #held, 2 do
+    local expires = tonumber(string.match(held[i + 1], '|([^|]*)$'))
+    if expires > now then
+        redis.call('SADD', KEYS[5], held[i])
+        if not next_expiry or expires < next_expiry then
+            next_expiry = expires
+        end
+    end
+end
+redis.call('SUNIONSTORE', KEYS[5], KEYS[5], KEYS[2])
+local expiry = next_expiry and tostring(next_expiry) or ''
+local added = redis.call('SDIFF', KEYS[5], KEYS[3])
+local removed = redis.call('SDIFF', KEYS[3], KEYS[5])
+if #added == 0 and #removed == 0 then
+    redis.call('DEL', KEYS[5])
+    return {0, 0, {}, {}, expiry}
+end
+local since = tonumber(redis.call('GET', KEYS[4]) or '0')
+redis.call('DEL', KEYS[3])
+if redis.call('EXISTS', KEYS[5]) == 1 then
+    redis.call('RENAME', KEYS[5], KEYS[3])
+end
+local version = redis.call('INCR', KEYS[4])
+return {since, version, added, removed, expiry}
+"""
+
+# Room state fields and their defaults
+DEFAULT_STATE = {
+    'phase': 'waiting',  # waiting -> countdown -> playing -> ended
+    'starts_at': 0.0,    # epoch seconds the countdown ends at
+    'game_id': 0,
+}
+
+
+def _decode_state(raw):
+    state = dict(DEFAULT_STATE)
+    for key, value in raw.items():
+        if key == 'starts_at':
+            value = float(value)
+        elif key == 'game_id':
+            value = int(value)
+        state[key] = value
+    return state
+
+
+class RoomStateStore:
+    """
+    Shared per-room state: connected players, the room phase and countdown
+    deadline, the numbers called so far and the selected/taken cards.
+
+    Every consumer and engine reads and writes room state through a store so
+    that all processes agree on it. Each method is a single atomic operation
+    on the backend.
+    """
+
+    async def add_player(self, room_name, username, ttl=PRESENCE_TTL):
+        """Add a player or refresh their presence for `ttl` seconds, returns the player count"""
+        raise NotImplementedError
+
+    async def remove_player(self, room_name, username):
+        """Remove a player, returns the new player count"""
+        raise NotImplementedError
+
+    async def player_count(self, room_name):
+        """Number of players whose presence has not expired"""
+        raise NotImplementedError
+
+    async def get_state(self, room_name):
+        """Phase, countdown deadline and game id of the room"""
+        raise NotImplementedError
+
+    async def set_state(self, room_name, **fields):
+        raise NotImplementedError
+
+    async def push_called(self, room_name, number):
+        """Append a called number, returns how many have been called"""
+        raise NotImplementedError
+
+    async def get_called(self, room_name, since=0):
+        """Numbers called after the first `since` ones"""
+        raise NotImplementedError
+
+    async def select_card(self, room_name, card_number, username, ttl=CARD_HOLD_TTL):
+        """
+        Hold a card for `ttl` seconds, atomically. True if the player now holds
+        it (holding it again renews the hold), False if someone else does or
+        the card is sold.
+        """
+        raise NotImplementedError
+
+    async def deselect_card(self, room_name, card_number, username):
+        """Release a card if `username` holds it"""
+        raise NotImplementedError
+
+    async def get_selected(self, room_name):
+        """{card_number: username} of cards held on the selection screen"""
+        raise NotImplementedError
+
+    async def add_taken(self, room_name, *card_numbers):
+        raise NotImplementedError
+
+    async def remove_taken(self, room_name, card_number):
+        raise NotImplementedError
+
+    async def get_taken(self, room_name):
+        raise NotImplementedError
+
+    async def taken_version(self, room_name):
+        """Version of the last taken_cards broadcast of the room"""
+        raise NotImplementedError
+
+    async def published_taken(self, room_name):
+        """The unavailable cards as of the last taken_cards broadcast"""
+        raise NotImplementedError
+
+    async def publish_taken(self, room_name):
+        """
+        Diff the unavailable cards, held or taken, against the last broadcast
+        and record them as the new base, atomically, so every process diffs
+        against the same base. Returns (diff, expires): diff is None if
+        nothing changed, else {'since', 'version', 'added', 'removed'};
+        expires is when the next hold lapses, None without holds.
+        """
+        raise NotImplementedError
+
+    async def bump_taken_version(self, room_name):
+        """Increment the taken_cards version, returns the new one"""
+        raise NotImplementedError
+
+    async def push_claim(self, room_name, claim):
+        """Queue a bingo claim (a dict) for the room's driver"""
+        raise NotImplementedError
+
+    async def pop_claims(self, room_name):
+        """Take every queued claim, oldest first"""
+        raise NotImplementedError
+
+    async def reset_game(self, room_name):
+        """Back to waiting: clears the called numbers, queued claims and the state fields"""
+        raise NotImplementedError
+
+    async def reset_cards(self, room_name):
+        """Clear the selected, taken and published cards"""
+        raise NotImplementedError
+
+    async def time_left(self, room_name):
+        """Whole seconds until the countdown deadline"""
+        state = await self.get_state(room_name)
+        return max(0, round(state['starts_at'] - time.time()))
+
+    async def holder(self, room_name, card_number):
+        """Username holding the card on the selection screen, or None"""
+        return (await self.get_selected(room_name)).get(int(card_number))
+
+    async def selection_state(self, room_name):
+        """Everything the card selection screen shows, in one read"""
+        return {
+            'state': await self.get_state(room_name),
+            'unavailable': await self.published_taken(room_name),
+            'taken_version': await self.taken_version(room_name),
+            'player_count': await self.player_count(room_name),
+        }
+
+
+class InMemoryRoomStateStore(RoomStateStore):
+    """Store for a single process (development, tests)"""
+
+    def __init__(self):
+        self.rooms = {}
+
+    def room(self, room_name):
+        room = self.rooms.get(room_name)
+        if room is None:
+            room = self.rooms[room_name] = {
+                'players': {},  # username -> presence expiry
+                'state': dict(DEFAULT_STATE),
+                'called': [],
+                'claims': [],
+                'selected': {},
+                'taken': set(),
+                'published': set(),
+                'taken_version': 0,
+            }
+        return room
+
+    async def add_player(self, room_name, username, ttl=PRESENCE_TTL):
+        self.room(room_name)['players'][username] = time.time() + ttl
+        return await self.player_count(room_name)
+
+    async def remove_player(self, room_name, username):
+        self.room(room_name)['players'].pop(username, None)
+        return await self.player_count(room_name)
+
+    async def player_count(self, room_name):
+        players = self.room(room_name)['players']
+        now = time.time()
+        for username in [u for u, expires in players.items() if expires <= now]:
+            del players[username]
+        return len(players)
+
+    async def get_state(self, room_name):
+        return dict(self.room(room_name)['state'])
+
+    async def set_state(self, room_name, **fields):
+        self.room(room_name)['state'].update(fields)
+
+    async def push_called(self, room_name, number):
+        called = self.room(room_name)['called']
+        called.append(number)
+        return len(called)
+
+    async def get_called(self, room_name, since=0):
+        return self.room(room_name)['called'][since:]
+
+    async def select_card(self, room_name, card_number, username, ttl=CARD_HOLD_TTL):
+        room = self.room(room_name)
+        if int(card_number) in room['taken']:
+            return False
+        selected = room['selected']
+        now = time.time()
+        owner, expires = selected.get(int(card_number), (username, 0))
+        if owner != username and expires > now:
+            return False
+        selected[int(card_number)] = (username, now + ttl)
+        return True
+
+    async def deselect_card(self, room_name, card_number, username):
+        selected = self.room(room_name)['selected']
+        if selected.get(int(card_number), (None, 0))[0] == username:
+            del selected[int(card_number)]
+
+    async def get_selected(self, room_name):
+        now = time.time()
+        return {
+            card: owner
+            for card, (owner, expires) in self.room(room_name)['selected'].items()
+            if expires > now
+        }
+
+    async def add_taken(self, room_name, *card_numbers):
+        self.room(room_name)['taken'].update(int(n) for n in card_numbers)
+
+    async def remove_taken(self, room_name, card_number):
+        self.room(room_name)['taken'].discard(int(card_number))
+
+    async def get_taken(self, room_name):
+        return set(self.room(room_name)['taken'])
+
+    async def taken_version(self, room_name):
+        return self.room(room_name)['taken_version']
+
+    async def published_taken(self, room_name):
+        return set(self.room(room_name)['published'])
+
+    async def publish_taken(self, room_name):
+        room = self.room(room_name)
+        now = time.time()
+        held = [expires for _, expires in room['selected'].values() if expires > now]
+        cards = room['taken'] | {card for card, (_, expires) in room['selected'].items() if expires > now}
+        expires = min(held, default=None)
+        published = room['published']
+        if cards == published:
+            return None, expires
+        since = room['taken_version']
+        room['taken_version'] += 1
+        room['published'] = cards
+        return {
+            'since': since,
+            'version': room['taken_version'],
+            'added': sorted(cards - published),
+            'removed': sorted(published - cards),
+        }, expires
+
+    async def bump_taken_version(self, room_name):
+        room = self.room(room_name)
+        room['taken_version'] += 1
+        return room['taken_version']
+
+    async def push_claim(self, room_name, claim):
+        self.room(room_name)['claims'].append(claim)
+
+    async def pop_claims(self, room_name):
+        room = self.room(room_name)
+        claims, room['claims'] = room['claims'], []
+        return claims
+
+    async def reset_game(self, room_name):
+        room = self.room(room_name)
+        room['state'] = dict(DEFAULT_STATE)
+        room['called'] = []
+        room['claims'] = []
+
+    async def reset_cards(self, room_name):
+        room = self.room(room_name)
+        room['selected'] = {}
+        room['taken'] = set()
+        room['published'] = set()
+
+
+class RedisRoomStateStore(RoomStateStore):
+    """
+    Store shared by every process through Redis. Each room uses a sorted set
+    of present players scored by their presence expiry, a hash for the state
+    fields, a list of called numbers, a list of claims waiting for the
+    driver, a hash of held cards (card -> "username|expires_at", updated by Lua scripts so a
+    hold is atomic), a set of taken cards, the set of unavailable cards last
+    broadcast and a counter versioning the taken_cards broadcasts.
+    """
+
+    def __init__(self, url, prefix='bingo:room'):
+        import redis.asyncio as redis
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.reserve = self.redis.register_script(RESERVE_SCRIPT)
+        self.release = self.redis.register_script(RELEASE_SCRIPT)
+        self.publish = self.redis.register_script(PUBLISH_TAKEN_SCRIPT)
+
+    def key(self, room_name, name):
+        return f'{self.prefix}:{room_name}:{name}'
+
+    async def add_player(self, room_name, username, ttl=PRESENCE_TTL):
+        key = self.key(room_name, 'presence')
+        now = time.time()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(key, {username: now + ttl})
+            pipe.zremrangebyscore(key, '-inf', now)
+            pipe.zcard(key)
+            *_, count = await pipe.execute()
+        return count
+
+    async def remove_player(self, room_name, username):
+        key = self.key(room_name, 'presence')
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(key, username)
+            pipe.zremrangebyscore(key, '-inf', time.time())
+            pipe.zcard(key)
+            *_, count = await pipe.execute()
+        return count
+
+    async def player_count(self, room_name):
+        return await self.redis.zcount(self.key(room_name, 'presence'), f'({time.time()}', '+inf')
+
+    async def get_state(self, room_name):
+        return _decode_state(await self.redis.hgetall(self.key(room_name, 'state')))
+
+    async def set_state(self, room_name, **fields):
+        await self.redis.hset(self.key(room_name, 'state'), mapping=fields)
+
+    async def push_called(self, room_name, number):
+        return await self.redis.rpush(self.key(room_name, 'called'), number)
+
+    async def get_called(self, room_name, since=0):
+        return [int(n) for n in await self.redis.lrange(self.key(room_name, 'called'), since, -1)]
+
+    async def select_card(self, room_name, card_number, username, ttl=CARD_HOLD_TTL):
+        held = await self.reserve(
+            keys=[self.key(room_name, 'selected'), self.key(room_name, 'taken')],
+            args=[int(card_number), username, time.time(), ttl]
+        )
+        return held == 1
+
+    async def deselect_card(self, room_name, card_number, username):
+        await self.release(keys=[self.key(room_name, 'selected')], args=[int(card_number), username])
+
+    async def get_selected(self, room_name):
+        now = time.time()
+        selected = {}
+        for card, held in (await self.redis.hgetall(self.key(room_name, 'selected'))).items():
+            owner, _, expires = held.rpartition('|')
+            if float(expires) > now:
+                selected[int(card)] = owner
+        return selected
+
+    async def add_taken(self, room_name, *card_numbers):
+        if card_numbers:
+            await self.redis.sadd(self.key(room_name, 'taken'), *(int(n) for n in card_numbers))
+
+    async def remove_taken(self, room_name, card_number):
+        await self.redis.srem(self.key(room_name, 'taken'), int(card_number))
+
+    async def get_taken(self, room_name):
+        return {int(n) for n in await self.redis.smembers(self.key(room_name, 'taken'))}
+
+    async def taken_version(self, room_name):
+        return int(await self.redis.get(self.key(room_name, 'taken_version')) or 0)
+
+    async def published_taken(self, room_name):
+        return {int(n) for n in await self.redis.smembers(self.key(room_name, 'published'))}
+
+    async def publish_taken(self, room_name):
+        since, version, added, removed, expires = await self.publish(
+            keys=[
+                self.key(room_name, 'selected'),
+                self.key(room_name, 'taken'),
+                self.key(room_name, 'published'),
+                self.key(room_name, 'taken_version'),
+                self.key(room_name, 'published_next'),
+            ],
+            args=[time.time()]
+        )
+        expires = float(expires) if expires else None
+        if not version:
+            return None, expires
+        return {
+            'since': since,
+            'version': version,
+            'added': sorted(int(n) for n in added),
+            'removed': sorted(int(n) for n in removed),
+        }, expires
+
+    async def bump_taken_version(self, room_name):
+        return await self.redis.incr(self.key(room_name, 'taken_version'))
+
+    async def selection_state(self, room_name):
+        now = time.time()
+        # One transaction, so the cards and their version belong together
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(self.key(room_name, 'state'))
+            pipe.smembers(self.key(room_name, 'published'))
+            pipe.get(self.key(room_name, 'taken_version'))
+            pipe.zcount(self.key(room_name, 'presence'), f'({now}', '+inf')
+            state, published, version, count = await pipe.execute()
+        return {
+            'state': _decode_state(state),
+            'unavailable': {int(n) for n in published},
+            'taken_version': int(version or 0),
+            'player_count': count,
+        }
+
+    async def push_claim(self, room_name, claim):
+        await self.redis.rpush(self.key(room_name, 'claims'), json.dumps(claim))
+
+    async def pop_claims(self, room_name):
+        key = self.key(room_name, 'claims')
+        async with self.redis.pipeline(transaction=True) as pipe:
+            claims, _ = await pipe.lrange(key, 0, -1).delete(key).execute()
+        return [json.loads(claim) for claim in claims]
+
+    async def reset_game(self, room_name):
+        await self.redis.delete(
+            self.key(room_name, 'state'),
+            self.key(room_name, 'called'),
+            self.key(room_name, 'claims')
+        )
+
+    async def reset_cards(self, room_name):
+        await self.redis.delete(
+            self.key(room_name, 'selected'),
+            self.key(room_name, 'taken'),
+            self.key(room_name, 'published')
+        )
+
+
+_store = None
+
+
+def get_store():
+    """The process wide store configured by ROOM_STATE_BACKEND"""
+    global _store
+    if _store is None:
+        if settings.ROOM_STATE_BACKEND == 'redis':
+            _store = RedisRoomStateStore(settings.ROOM_STATE_REDIS_URL)
+        else:
+            _store = InMemoryRoomStateStore()
+    return _store
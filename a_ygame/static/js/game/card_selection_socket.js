@@ -11,7 +11,9 @@
     let currentUsername = document.getElementById('current-username').textContent.replace(/"/g, '');
     let timeLeft = 30; // Default time
     let takenCards = new Set();
+    let takenVersion = 0; // version of the last taken_cards state applied
     let gameEndedHandled = false;
+    let catalog = null; // {first, cards} for this room, fetched once
 
     // Initialize WebSocket connection request_active_cards
     function initWebSocket() {
@@ -24,47 +26,16 @@
         socket.onopen = function() {
             console.log('WebSocket connection established');
             reconnectAttempts = 0;
-            
-            // Request current game state when connecting
-            socket.send(JSON.stringify({
-                'type': 'get_state'
-            }));
+            syncClock(socket);
+            // The server greets us with a hello frame holding the room state
         };
 
         socket.onmessage = function(e) {
             try {
                 const data = JSON.parse(e.data);
                 console.log('Received WebSocket message:', data);
-                if (data.type === 'selected_cards_update') {
-                    const selected = data.selected_cards || [];
-                    // First enable all cards
-                    document.querySelectorAll('.card-button').forEach(button => {
-                        button.disabled = false;
-                        button.classList.remove('bg-red-600');
-                        button.classList.add('bg-emerald-500')
-                    });
-                    
-                    selected.forEach(cardNumber => {
-                        const button = document.querySelector(`[data-card-number="${cardNumber}"]`);
-                        if (button && cardNumber !== selectedCard) {
-                            button.disabled = true;
-                            button.classList.remove('bg-emerald-500');
-                            button.classList.add('bg-red-600');
-                        }
-                    });
-                }
-
-                if (data.type === 'taken_cards_update' || data.type === 'active_cards_response') {
-                    // Then disable taken cards
-                    const cards = data.taken_cards || data.active_cards || [];
-                    cards.forEach(cardNumber => {
-                        const button = document.querySelector(`[data-card-number="${cardNumber}"]`);
-                        if (button) {
-                            button.disabled = true;
-                            button.classList.remove('bg-emerald-500')
-                            button.classList.add('bg-red-600');
-                        }
-                    });
+                if (data.type === 'taken_cards') {
+                    applyTakenCards(data);
                 }
 
                 // Handle immediate game started notification
@@ -142,86 +113,79 @@
                         }
                         break;
 
-                
+                    case 'card_unavailable':
+                        // Someone else holds the card, undo our optimistic pick
+                        if (selectedCard == data.card_number) {
+                            selectedCard = null;
+                        }
+                        const unavailableButton = document.querySelector(`[data-card-number="${data.card_number}"]`);
+                        if (unavailableButton) {
+                            unavailableButton.classList.remove('bg-emerald-500', 'bg-blue-600');
+                            unavailableButton.classList.add('bg-red-600');
+                            unavailableButton.disabled = true;
+                        }
+                        takenCards.add(parseInt(data.card_number));
+                        showToast(data.message);
+                        break;
 
-                    case 'game_state':
-                        // Also robustly enable all card buttons on game_state
-                        document.querySelectorAll('.card-button').forEach(button => {
-                            button.disabled = false;
-                            button.classList.remove('bg-red-600');
-                        });
+                    case 'error':
+                        showToast(data.message);
                         break;
-                    case 'card_deselected':
-                        const diselected_card = document.querySelector(`[data-card-number="${data.card_number}"]`);
-                        if (diselected_card) {
-                            diselected_card.classList.remove('bg-red-600', 'bg-blue-600');
-                            diselected_card.classList.add('bg-emerald-500');
-                            diselected_card.disabled = false;
-                            
-                            // If this was our card, clear selection
-                            if (data.username === currentUsername) {
-                                selectedCard = null;
-                                //document.getElementById('selectedCardDisplay').textContent = '0';
-                            }
-                            
-                            // Update taken cards set
-                            takenCards.delete(parseInt(data.card_number));
-                            
-                            // If game ended, reset game state
-                            if (data.game_ended) {
-                                gameStarted = false;
-                                showToast('Game has ended. You can select a new card.');
-                                
-                                // Reset preview container
-                                const previewContainer = document.getElementById('previewContainer');
-                                previewContainer.innerHTML = `
-                                    <div class="text-center">
-                                        <i class="fas fa-dice-d20 text-3xl mb-2 text-emerald-400"></i>
-                                        <p id="previewText" class="text-sm text-gray-300">Select a card to preview</p>
-                                    </div>
-                                `;
-                            }
+
+                    case 'cards_released':
+                        // The game is over, every card is free again
+                        if (selectedCard) {
+                            const ownButton = document.querySelector(`[data-card-number="${selectedCard}"]`);
+                            if (ownButton) ownButton.classList.remove('selected');
+                            selectedCard = null;
+                            document.getElementById('selectedCardDisplay').textContent = '0';
                         }
+                        gameStarted = false;
+                        applyTakenCards({version: data.version, since: null, added: [], removed: []});
                         break;
 
-                    case 'card_released':
-                        const releasedButton = document.querySelector(`[data-card-number="${data.card_number}"]`);
-                        if (releasedButton) {
-                            releasedButton.classList.remove('bg-red-600', 'bg-blue-600');
-                            releasedButton.classList.add('bg-emerald-500');
-                            releasedButton.disabled = false;
-                            
-                            // If this was our card, clear selection
-                            if (data.username === currentUsername) {
-                                selectedCard = null;
-                                //(null);
-                                document.getElementById('selectedCardDisplay').textContent = '0';
-                            }
-                            
-                            // Update taken cards set
-                            takenCards.delete(parseInt(data.card_number));
-                            
-                            // If game ended, reset game state
-                            if (data.game_ended) {
-                                gameStarted = false;
-                                showToast('Game has ended. You can select a new card.');
-                            }
+                    case 'hello':
+                        // A new socket starts from the server's state
+                        takenVersion = 0;
+                        gameStarted = data.game_started;
+                        applyTakenCards({
+                            version: data.taken_version,
+                            since: null,
+                            added: data.taken_cards,
+                            removed: []
+                        });
+                        if (gameStarted) {
+                            disableCardButtons();
+                            showToast(data.message);
+                        } else {
+                            clockFromServer(data.now);
+                            showCountdown(data.starts_at);
                         }
                         break;
-                    
-                    case 'countdown_update':
-                        timeLeft = data.time_left;
-                        document.getElementById('countdownValue').textContent = timeLeft;
-                        //showToast(data.message);
-                        
-                        if (timeLeft <= 0) {
-                            clearInterval(countdownInterval);
-                            timerStarted = false;
-                            gameStarted = true;
+
+                    case 'clock':
+                        handleClockReply(data);
+                        break;
+
+                    case 'game_state':
+                        // Full state, replaces whatever diffs were applied
+                        if (data.taken_cards) {
+                            applyTakenCards({
+                                version: data.taken_version,
+                                since: null,
+                                added: data.taken_cards,
+                                removed: []
+                            });
                         }
                         break;
+                    case 'countdown_update':
+                        // Only sent when the deadline changes, the countdown runs locally
+                        clockFromServer(data.now);
+                        showCountdown(data.starts_at);
+                        break;
 
                     case 'game_started':
+                        stopDeadlineCountdown();
                         gameStarted = true;
                         disableCardButtons();
                         showToast(data.message);
@@ -259,7 +223,8 @@
 
                         // Show celebration for winner
                         if (isWinner) {
-                            showToast(`Congratulations! You won ${data.bonus} credits!`);
+                            const won = (data.shares && data.shares[currentUsername]) || data.bonus;
+                            showToast(`Congratulations! You won ${won} credits!`);
                             // Add any winner-specific UI effects here
                         } else {
                             showToast(data.message);
@@ -282,6 +247,7 @@
                         //(null);
                         
                         // Enable join game button
+                        stopDeadlineCountdown();
                         timeLeft = 30;
                         document.getElementById('countdownValue').textContent = timeLeft;
                         
@@ -310,6 +276,61 @@
             console.error('WebSocket error:', error);
         };
     }
+    // Apply a taken_cards diff; a diff without a base replaces the whole set
+    function applyTakenCards(data) {
+        if (data.since === null || data.since === undefined) {
+            if (data.version < takenVersion) return;
+            const previous = takenCards;
+            takenCards = new Set(data.added.map(Number));
+            previous.forEach(cardNumber => markCard(cardNumber));
+            takenCards.forEach(cardNumber => markCard(cardNumber));
+        } else {
+            if (data.version <= takenVersion) return;
+            if (data.since !== takenVersion) {
+                // Missed a diff, ask for the full state
+                socket.send(JSON.stringify({'type': 'get_state'}));
+                return;
+            }
+            data.added.forEach(cardNumber => takenCards.add(Number(cardNumber)));
+            data.removed.forEach(cardNumber => takenCards.delete(Number(cardNumber)));
+            data.added.concat(data.removed).forEach(cardNumber => markCard(Number(cardNumber)));
+        }
+        takenVersion = data.version;
+    }
+
+    // Paint a card button as taken or free, leaving our own card alone
+    function markCard(cardNumber) {
+        if (cardNumber == selectedCard) return;
+        const button = document.querySelector(`[data-card-number="${cardNumber}"]`);
+        if (!button) return;
+        if (takenCards.has(cardNumber)) {
+            button.classList.remove('bg-emerald-500', 'bg-blue-600');
+            button.classList.add('bg-red-600');
+            button.disabled = true;
+        } else {
+            button.classList.remove('bg-red-600', 'bg-blue-600');
+            button.classList.add('bg-emerald-500');
+            button.disabled = gameStarted;
+        }
+    }
+
+    // Count down to the game start deadline, null when the countdown was called off
+    function showCountdown(startsAt) {
+        const countdownElement = document.getElementById('countdownValue');
+        if (!startsAt) {
+            stopDeadlineCountdown();
+            timerStarted = false;
+            timeLeft = 30;
+            countdownElement.textContent = timeLeft;
+            return;
+        }
+        timerStarted = true;
+        runDeadlineCountdown(startsAt, countdownElement, () => {
+            timerStarted = false;
+            gameStarted = true;
+        });
+    }
+
     // Toast notification
     function showToast(message) {
         const toast = document.getElementById('toast');
@@ -422,11 +443,10 @@
                 </div>
             `;
 
-            // Fetch the card preview
-            fetch(`/bingo/preview-card/${cardNumber}/`)
-                .then(response => response.text())
-                .then(html => {
-                    previewContainer.innerHTML = html;
+            // Render the preview from the room's card catalog
+            loadCatalog()
+                .then(() => {
+                    previewContainer.innerHTML = renderCardPreview(cardNumber);
                 })
                 .catch(error => {
                     previewContainer.innerHTML = `
@@ -464,12 +484,7 @@
             return;
         }
 
-        if (socket && socket.readyState === WebSocket.OPEN) {
-            socket.send(JSON.stringify({
-                type: 'card_activated',
-                card_number: selectedCard
-            }));
-        }
+        // The server marks the card taken once the purchase has gone through
         if (button) {
             button.disabled = true;
             button.classList.add('bg-red-600', 'disabled');
@@ -501,10 +516,57 @@
         });
     }
 
+// Fetch every card of the room in one (cached) request
+function loadCatalog() {
+    if (catalog) {
+        return Promise.resolve(catalog);
+    }
+    const roomName = document.getElementById('room-name').textContent.replace(/"/g, '');
+    return fetch(`/bingo/card-catalog/${roomName}/`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Card catalog request failed: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            catalog = data;
+            return catalog;
+        });
+}
+
+// Same markup as card_preview.html, built from the catalog
+function renderCardPreview(cardNumber) {
+    const cells = catalog.cards[parseInt(cardNumber) - catalog.first];
+    if (!cells) {
+        throw new Error(`Card ${cardNumber} is not in the catalog`);
+    }
+    let rows = '';
+    for (let row = 0; row < 5; row++) {
+        let cols = '';
+        for (let col = 0; col < 5; col++) {
+            const number = cells[row * 5 + col];
+            const color = number === 0 ? 'bg-green-800' : 'bg-gray-700';
+            cols += `<div class="flex items-center justify-center text-[10px] font-bold rounded-sm h-full ${color} text-white">${number === 0 ? '*' : number}</div>`;
+        }
+        rows += `<div class="grid grid-cols-5 gap-0.5 h-full">${cols}</div>`;
+    }
+    return `
+        <div class="w-full h-full flex items-center justify-center p-1">
+            <div class="w-full max-w-[120px] h-[120px] overflow-hidden bingo-card">
+                <div class="grid grid-rows-5 gap-0.5 bg-gray-900 p-0.5 rounded shadow-sm h-full">${rows}</div>
+            </div>
+        </div>
+    `;
+}
+
 // Initialize everything when the DOM is loaded
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize WebSocket
     initWebSocket();
+
+    // Warm the card catalog so the first preview is instant
+    loadCatalog().catch(error => console.error('Error loading card catalog:', error));
     
     // Add click handlers for card buttons
     document.querySelectorAll('.card-button').forEach(button => {
@@ -0,0 +1,65 @@
+// Server clock
+// The engine broadcasts the countdown as an absolute deadline (epoch seconds
+// on the server clock) and the page renders it locally. A clock round trip
+// on each socket measures how far our clock is from the server's.
+let clockOffset = 0; // server time - local time, in ms
+let clockRoundTrip = Infinity; // round trip of the sample clockOffset comes from
+let deadlineTimer = null;
+
+// Ask the server for its time, the reply goes to handleClockReply
+function syncClock(socket) {
+    if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({
+            'type': 'clock',
+            'sent': Date.now()
+        }));
+    }
+}
+
+// Keep the sample with the shortest round trip, its offset is the most accurate
+function handleClockReply(data) {
+    const received = Date.now();
+    const roundTrip = received - data.sent;
+    if (roundTrip <= clockRoundTrip) {
+        clockRoundTrip = roundTrip;
+        clockOffset = data.now * 1000 - (data.sent + received) / 2;
+    }
+}
+
+// Rough offset from a server timestamp, until a round trip has been measured
+function clockFromServer(now) {
+    if (clockRoundTrip === Infinity && now) {
+        clockOffset = now * 1000 - Date.now();
+    }
+}
+
+function serverNow() {
+    return Date.now() + clockOffset;
+}
+
+// Whole seconds left until `startsAt` (epoch seconds on the server clock)
+function secondsUntil(startsAt) {
+    return Math.max(0, Math.ceil((startsAt * 1000 - serverNow()) / 1000));
+}
+
+// Show the seconds left until `startsAt` in `element`, calling onDone once it is reached
+function runDeadlineCountdown(startsAt, element, onDone) {
+    stopDeadlineCountdown();
+    const tick = () => {
+        const left = secondsUntil(startsAt);
+        element.textContent = left;
+        if (left === 0) {
+            stopDeadlineCountdown();
+            if (onDone) onDone();
+        }
+    };
+    deadlineTimer = setInterval(tick, 250);
+    tick();
+}
+
+function stopDeadlineCountdown() {
+    if (deadlineTimer) {
+        clearInterval(deadlineTimer);
+        deadlineTimer = null;
+    }
+}
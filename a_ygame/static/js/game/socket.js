@@ -17,6 +17,7 @@ function initWebSocket() {
     socket.onopen = function() {
         console.log('WebSocket connection established');
         reconnectAttempts = 0;
+        syncClock(socket);
         // Start the game when connected
         startGame();
     };
@@ -43,9 +44,15 @@ function initWebSocket() {
                 handleGameEnded(data);
                 break;
             case 'number_called':
-                handleNumberCalled(data);
-                calledNumbers = data.called_numbers || [];
-                console.log('Called numbers:', calledNumbers);
+                receiveCalledNumber(data);
+                break;
+            case 'called_numbers':
+                // Reply to a gap request: the draw log from `since` on
+                calledNumbers = calledNumbers.slice(0, data.since).concat(data.numbers);
+                refreshCalledNumbers();
+                break;
+            case 'snapshot':
+                applySnapshot(data);
                 break;
             case 'error':
                 console.log('Error message received:', data);
@@ -72,26 +79,19 @@ function initWebSocket() {
                 // Update UI based on player count
                 updateUIForPlayerCount(data.count);
                 break;
+            case 'clock':
+                handleClockReply(data);
+                break;
             case 'countdown_update':
-                // Update countdown timer start_game game_started
-                const { time_left, message } = data;
-                const countdownElement = document.getElementById('countdownValue');
-                if (countdownElement) {
-                    countdownElement.textContent = time_left;
-                    
-                    // Show GO! when countdown reaches 0
-                    if (time_left === 0) {
-                        countdownElement.textContent = '0';
-                        setTimeout(() => {
-                            countdownElement.textContent = 'Playing...';
-                        }, 1000);
-                        updateRecentCalls([]);
-                    }
-                }
+                // Only sent when the deadline changes, the countdown runs locally
+                clockFromServer(data.now);
+                showCountdown(data.starts_at);
                 break;
             case 'game_reset':
                 // Reset the game state
+                stopDeadlineCountdown();
                 gameActive = false;
+                calledNumbers = [];
                 // Re-enable card buttons
                 const cardButtons = document.querySelectorAll('.card-button');
                 cardButtons.forEach(button => {
@@ -102,13 +102,19 @@ function initWebSocket() {
                 break;
             case 'game_started':
                 // Game has started
+                stopDeadlineCountdown();
                 gameActive = true;
+                calledNumbers = [];
                 // Disable card selection
                 handleGameStarted();
                 
                 // Show game started message
                 showToast('Game has started!');
                 break;
+            case 'bingo_available':
+                // The server saw our card complete a pattern
+                showToast('You have a BINGO! Press BINGO to claim it.');
+                break;
             case 'toast':
                 // Handle toast messages
                 showToast(data.message);
@@ -145,15 +151,99 @@ function updateUIForPlayerCount(count) {
     }
 }
 
+// Catch up with the room from the single frame sent on (re)connect
+function applySnapshot(data) {
+    gameActive = data.phase === 'playing';
+
+    // `called` is a bitmap of the numbers called, `recent` the last few in order
+    const called = BigInt('0x' + (data.called || '0'));
+    const recent = data.recent || [];
+    const numbers = [];
+    for (let n = 1; n <= 75; n++) {
+        if ((called >> BigInt(n - 1)) & 1n && !recent.includes(n)) {
+            numbers.push(n);
+        }
+    }
+    calledNumbers = numbers.concat(recent);
+    refreshCalledNumbers();
+
+    const playerCountElement = document.getElementById('player-count');
+    if (playerCountElement) {
+        playerCountElement.textContent = data.player_count;
+    }
+    updateUIForPlayerCount(data.player_count);
+
+    clockFromServer(data.now);
+    if (data.phase === 'countdown') {
+        showCountdown(data.starts_at);
+    } else if (gameActive) {
+        const countdownElement = document.getElementById('countdownValue');
+        if (countdownElement) {
+            countdownElement.textContent = 'Playing...';
+        }
+    }
+}
+
+// Count down to the game start deadline, null when the countdown was called off
+function showCountdown(startsAt) {
+    const countdownElement = document.getElementById('countdownValue');
+    if (!countdownElement) return;
+    if (!startsAt) {
+        stopDeadlineCountdown();
+        countdownElement.textContent = '30';
+        return;
+    }
+    runDeadlineCountdown(startsAt, countdownElement, () => {
+        setTimeout(() => {
+            countdownElement.textContent = 'Playing...';
+        }, 1000);
+        updateRecentCalls([]);
+    });
+}
+
+// Calls only carry {seq, number}; ask the server for any we missed
+function receiveCalledNumber(data) {
+    const { seq, number } = data;
+    if (seq === calledNumbers.length + 1) {
+        calledNumbers.push(number);
+    } else if (seq > calledNumbers.length + 1) {
+        requestCalledNumbers(calledNumbers.length);
+    } else if (calledNumbers[seq - 1] === number) {
+        return; // Already have it
+    } else {
+        // Out of sync with the room, fetch the whole draw
+        requestCalledNumbers(0);
+    }
+    handleNumberCalled(data);
+}
+
+function requestCalledNumbers(since) {
+    if (socket && socket.readyState === WebSocket.OPEN) {
+        socket.send(JSON.stringify({
+            'action': 'get_called',
+            'since': since
+        }));
+    }
+}
+
+// Redraw the board and recent calls from calledNumbers
+function refreshCalledNumbers() {
+    document.querySelectorAll('.number-cell').forEach(cell => {
+        cell.classList.remove('bg-green-500');
+    });
+    updateCalledNumbersOnBoard();
+    updateRecentCalls(calledNumbers);
+}
+
 // Handle number called event
 async function handleNumberCalled(data) {
-    const { number, display, letter, called_numbers } = data;
+    const { number } = data;
     console.log('Handling number called:', data);
     
     // Update current number display
     const currentNumberElement = document.getElementById('current-number');
     if (currentNumberElement) {
-        currentNumberElement.textContent = display || number;
+        currentNumberElement.textContent = `${getBingoLetter(number)}-${number}`;
         
         // Add animation class
         //currentNumberElement.parentElement.classList.add('animate-ping');
@@ -175,24 +265,8 @@ async function handleNumberCalled(data) {
     }
     
     // Update called numbers on the board
-    if (called_numbers && Array.isArray(called_numbers)) {
-        // First clear all marks to ensure we're in sync
-        document.querySelectorAll('.number-cell').forEach(cell => {
-            cell.classList.remove('bg-green-500');
-        });
-        
-        // Mark all called numbers
-        called_numbers.forEach(num => {
-            markNumberAsCalled(num);
-        });
-        
-        // Update recent calls display with the most recent 4 numbers
-        updateRecentCalls(called_numbers);
-    } else {
-        // Fallback to single number update
-        markNumberAsCalled(number);
-        updateRecentCalls([number]);
-    }
+    markNumberAsCalled(number);
+    updateRecentCalls(calledNumbers);
 }
 
 // Mark a number as called on the board and update recent calls
@@ -262,23 +336,8 @@ function startCountdown() {
 
 // Handle bingo declaration
 function declareBingo() {
-    const cardCells = document.querySelectorAll('.card-cell');
-    const username = document.getElementById('current-username').textContent.trim();
     const roomName = document.getElementById('room-name').textContent.trim();
-
     console.log('Declaring BINGO for room:', roomName);
-    console.log('Username:', username);
-    
-    const cardNumbers = Array.from(cardCells).map(cell => {
-        const raw = cell.dataset.number;
-        const num = raw === '*' ? '*' : parseInt(raw);
-        const index = parseInt(cell.dataset.index);
-        if (num === '*') return '*';  // Always include center
-        return cell.classList.contains('bg-green-500') ? num : null;
-    });
-    
-    
-    console.log('Card numbers (5x5 grid):', cardNumbers);
     
     // Show loading state
     const bingoButton = document.querySelector('button[onclick="declareBingo()"]');
@@ -289,11 +348,9 @@ function declareBingo() {
     
     // Send bingo declaration to the server
     if (socket && socket.readyState === WebSocket.OPEN) {
+        // The server checks our card against the called numbers itself
         const message = {
-            'action': 'declare_bingo',
-            'username': username,
-            'room_name': roomName,
-            'card_numbers': cardNumbers
+            'action': 'declare_bingo'
         };
         //console.log('Sending BINGO declaration:', message);
         socket.send(JSON.stringify(message));
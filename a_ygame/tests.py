@@ -1,3 +1,166 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+
+from a_ygame.arbiter import ClaimArbiter, TIE_FIRST, TIE_SPLIT
+from a_ygame.bingo import FREE
+from a_ygame.engine import split_bonus
+from a_ygame.leases import Lease
+from a_ygame.models import RoomLease
+from a_ygame.state import InMemoryRoomStateStore
+
+
+class LeaseTests(TransactionTestCase):
+    """
+    Acquire, renew, expiry and failover of the room lease. Not a TestCase:
+    database_sync_to_async closes connections left inside a transaction.
+    """
+
+    def acquire(self, lease):
+        return async_to_sync(lease.acquire)()
+
+    def expire(self, room_name):
+        RoomLease.objects.filter(room_name=room_name).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+    def test_acquire_free_room(self):
+        self.assertTrue(self.acquire(Lease('room', owner='a')))
+        self.assertEqual(RoomLease.objects.get(room_name='room').owner, 'a')
+
+    def test_held_lease_is_exclusive(self):
+        self.assertTrue(self.acquire(Lease('room', owner='a')))
+        self.assertFalse(self.acquire(Lease('room', owner='b')))
+        self.assertEqual(RoomLease.objects.get(room_name='room').owner, 'a')
+
+    def test_renew_extends_expiry(self):
+        lease = Lease('room', owner='a')
+        self.acquire(lease)
+        RoomLease.objects.filter(room_name='room').update(expires_at=timezone.now())
+        self.assertTrue(async_to_sync(lease.renew)())
+        self.assertGreater(RoomLease.objects.get(room_name='room').expires_at, timezone.now())
+
+    def test_expired_lease_fails_over(self):
+        self.acquire(Lease('room', owner='a'))
+        self.expire('room')
+        self.assertTrue(self.acquire(Lease('room', owner='b')))
+        self.assertEqual(RoomLease.objects.get(room_name='room').owner, 'b')
+        # The old owner cannot renew once it has been taken over
+        self.assertFalse(self.acquire(Lease('room', owner='a')))
+
+    def test_release_only_drops_own_lease(self):
+        self.acquire(Lease('room', owner='a'))
+        async_to_sync(Lease('room', owner='b').release)()
+        self.assertTrue(RoomLease.objects.filter(room_name='room', owner='a').exists())
+        async_to_sync(Lease('room', owner='a').release)()
+        self.assertTrue(self.acquire(Lease('room', owner='b')))
+
+
+class PresenceTests(SimpleTestCase):
+    def test_presence_expires_without_refresh(self):
+        store = InMemoryRoomStateStore()
+        async_to_sync(store.add_player)('room', 'a')
+        self.assertEqual(async_to_sync(store.add_player)('room', 'b', ttl=0), 1)
+        self.assertEqual(async_to_sync(store.player_count)('room'), 1)
+
+    def test_refresh_keeps_player_once(self):
+        store = InMemoryRoomStateStore()
+        async_to_sync(store.add_player)('room', 'a', ttl=0)
+        self.assertEqual(async_to_sync(store.add_player)('room', 'a'), 1)
+        self.assertEqual(async_to_sync(store.remove_player)('room', 'a'), 0)
+
+
+class PublishTakenTests(SimpleTestCase):
+    def test_diffs_follow_the_stored_base(self):
+        store = InMemoryRoomStateStore()
+        async_to_sync(store.add_taken)('room', 3)
+        diff, expires = async_to_sync(store.publish_taken)('room')
+        self.assertEqual(diff, {'since': 0, 'version': 1, 'added': [3], 'removed': []})
+        self.assertIsNone(expires)
+        # Nothing changed, nothing to send
+        self.assertEqual(async_to_sync(store.publish_taken)('room'), (None, None))
+
+        async_to_sync(store.remove_taken)('room', 3)
+        async_to_sync(store.select_card)('room', 5, 'a')
+        diff, expires = async_to_sync(store.publish_taken)('room')
+        self.assertEqual(diff, {'since': 1, 'version': 2, 'added': [5], 'removed': [3]})
+        self.assertIsNotNone(expires)
+
+    def test_lapsed_hold_is_removed(self):
+        store = InMemoryRoomStateStore()
+        async_to_sync(store.select_card)('room', 5, 'a', ttl=0.01)
+        diff, _ = async_to_sync(store.publish_taken)('room')
+        self.assertEqual(diff['added'], [5])
+        time.sleep(0.02)
+        diff, expires = async_to_sync(store.publish_taken)('room')
+        self.assertEqual(diff['removed'], [5])
+        self.assertIsNone(expires)
+
+
+CORNERS = [[0, 4, 20, 24]]
+
+
+def corner_card(corners):
+    """A card whose four corners are `corners`, numbers 50-74 elsewhere"""
+    card = list(range(50, 75))
+    card[12] = FREE
+    for index, number in zip(CORNERS[0], corners):
+        card[index] = number
+    return card
+
+
+class ClaimArbiterTests(SimpleTestCase):
+    def arbiter(self, tie_rule=TIE_FIRST):
+        # Numbers are called in order, so a card wins at its highest corner
+        return ClaimArbiter(1, list(range(1, 76)), tie_rule, CORNERS)
+
+    def test_lowest_cursor_beats_earlier_arrival(self):
+        arbiter = self.arbiter()
+        arbiter.submit('late', 2, corner_card([5, 6, 7, 8]), 10)
+        arbiter.submit('early', 1, corner_card([1, 2, 3, 4]), 10)
+        self.assertEqual([claim.username for claim in arbiter.decide()], ['early'])
+
+    def test_first_rule_keeps_the_first_tied_claim(self):
+        arbiter = self.arbiter(TIE_FIRST)
+        arbiter.submit('a', 1, corner_card([1, 2, 3, 4]), 10)
+        arbiter.submit('b', 2, corner_card([4, 3, 2, 1]), 10)
+        self.assertEqual([claim.username for claim in arbiter.decide()], ['a'])
+
+    def test_split_rule_keeps_every_tied_claim(self):
+        arbiter = self.arbiter(TIE_SPLIT)
+        arbiter.submit('a', 1, corner_card([1, 2, 3, 4]), 10)
+        arbiter.submit('b', 2, corner_card([4, 3, 2, 1]), 10)
+        arbiter.submit('c', 3, corner_card([5, 6, 7, 8]), 10)
+        self.assertEqual([claim.username for claim in arbiter.decide()], ['a', 'b'])
+
+    def test_duplicate_claim_is_refused(self):
+        arbiter = self.arbiter()
+        self.assertIsNotNone(arbiter.submit('a', 1, corner_card([1, 2, 3, 4]), 10))
+        self.assertIsNone(arbiter.submit('a', 1, corner_card([1, 2, 3, 4]), 10))
+
+    def test_claim_before_the_card_has_won_is_refused(self):
+        arbiter = self.arbiter()
+        self.assertIsNone(arbiter.submit('a', 1, corner_card([1, 2, 3, 4]), 3))
+        self.assertEqual(arbiter.decide(), [])
+
+    def test_no_claims_after_the_decision(self):
+        arbiter = self.arbiter()
+        arbiter.submit('a', 1, corner_card([1, 2, 3, 4]), 10)
+        arbiter.decide()
+        self.assertIsNone(arbiter.submit('b', 2, corner_card([4, 3, 2, 1]), 10))
+
+
+class SplitBonusTests(SimpleTestCase):
+    def test_remainder_goes_to_the_first_winner(self):
+        self.assertEqual(split_bonus(Decimal('10.00'), 3), [Decimal('3.34'), Decimal('3.33'), Decimal('3.33')])
+
+    def test_shares_add_up_to_the_bonus(self):
+        for bonus in ('10.00', '0.01', '99.99', '123.45'):
+            for count in range(1, 8):
+                shares = split_bonus(Decimal(bonus), count)
+                self.assertEqual(sum(shares), Decimal(bonus))
+                self.assertTrue(all(share == share.quantize(Decimal('0.01')) for share in shares))
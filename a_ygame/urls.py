@@ -8,6 +8,7 @@ urlpatterns = [
     path('join-room/<str:room_name>/', views.join_room, name='join_room'),
     path('card-selection/<str:room_name>/', views.card_selection, name='card_selection'),
     path('preview-card/<int:card_number>/', views.preview_card, name='preview_card'),
+    path('card-catalog/<str:room_name>/', views.card_catalog, name='card_catalog'),
     path('join-game/<str:room_name>/', views.join_game, name='join_game'),
     path('game/<str:room_name>/', views.game_view, name='game'),
 ]
\ No newline at end of file
@@ -0,0 +1,41 @@
+"""
+Whole-room win evaluation with NumPy, for rooms with thousands of cards.
+
+Cards are a (cards x 25) uint8 matrix in the usual 25 cell layout, with the
+free '*' center stored as 0. Patterns are a (patterns x 25) boolean matrix.
+A card wins once some pattern has no uncalled cell left, which for every
+card at once is one matrix product of the uncalled cells with the patterns.
+"""
+import numpy as np
+
+from a_ygame.bingo import PATTERNS, FREE
+
+
+def card_matrix(cards):
+    """(cards x 25) uint8 matrix, the free center becomes 0"""
+    return np.array(
+        [[0 if cell == FREE else cell for cell in card] for card in cards],
+        dtype=np.uint8
+    ).reshape(-1, 25)
+
+
+def pattern_matrix(patterns=PATTERNS):
+    """(patterns x 25) boolean matrix, True for the cells a pattern needs"""
+    matrix = np.zeros((len(patterns), 25), dtype=bool)
+    for row, pattern in enumerate(patterns):
+        matrix[row, pattern] = True
+    return matrix
+
+
+def winning_cards(cards, called_numbers, patterns):
+    """
+    Boolean vector, True for the cards (a card_matrix) that complete any of
+    the patterns (a pattern_matrix) with the numbers called so far.
+    """
+    called = np.zeros(76, dtype=bool)
+    called[0] = True  # the free center
+    called[list(called_numbers)] = True
+    uncalled = ~called[cards]
+    missing = uncalled.astype(np.float32) @ patterns.T.astype(np.float32)
+    return (missing == 0).any(axis=1)
+